@@ -0,0 +1,171 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Bounded in-process mapping with per-entry expiry and LRU eviction
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0, name: str = "cache"):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        self.name = name
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        """
+        Return (found, missing) for a batch of keys
+        """
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        for key in keys:
+            hit, value = self._lookup(key)
+            if hit:
+                self.hits += 1
+                found[key] = value
+            else:
+                self.misses += 1
+                missing.append(key)
+        return found, missing
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CatalogCache:
+    """
+    Product documents by id plus precomputed listing pools (featured, new arrivals).
+
+    Admin product writes invalidate synchronously in the worker that handled them;
+    the TTL bounds how long other workers may serve the previous version.
+    """
+
+    def __init__(self, max_products: int = 2000, ttl: float = 300.0):
+        self.products = TTLCache(max_products, ttl, name="products")
+        self.pools = TTLCache(32, ttl, name="pools")
+        # Bumped on every invalidation so reads that raced a write don't repopulate stale data
+        self.generation = 0
+
+    def get_products(self, product_ids: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        found, missing = self.products.get_many(product_ids)
+        return {pid: dict(product) for pid, product in found.items()}, missing
+
+    def set_products(self, products: Iterable[Dict[str, Any]], generation: int) -> None:
+        if generation != self.generation:
+            return
+        for product in products:
+            self.products.set(product["id"], dict(product))
+
+    def get_pool(self, name: str) -> Optional[List[Dict[str, Any]]]:
+        pool = self.pools.get(name)
+        if pool is None:
+            return None
+        return [dict(product) for product in pool]
+
+    def set_pool(self, name: str, products: List[Dict[str, Any]], generation: int) -> None:
+        if generation != self.generation:
+            return
+        self.pools.set(name, [dict(product) for product in products])
+
+    def invalidate_product(self, product_id: Optional[str] = None) -> None:
+        if product_id:
+            self.products.delete(product_id)
+        self.pools.clear()
+        self.generation += 1
+
+    def clear(self) -> None:
+        self.products.clear()
+        self.pools.clear()
+        self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": self.products.stats(),
+            "pools": self.pools.stats(),
+            "generation": self.generation,
+        }
+
+
+class ResponseCache:
+    """
+    Encoded JSON bodies for hot public endpoints, so repeat requests skip both the
+    database and serialization.
+
+    Entries live in a namespace (one per endpoint) and carry a caller-supplied tag,
+    e.g. the catalog generation; a lookup with a different tag is a miss. Writes
+    that change an endpoint's data call invalidate(namespace).
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 60.0):
+        self.bodies = TTLCache(max_size, ttl, name="responses")
+        self._versions: Dict[str, int] = {}
+
+    async def get_or_render(
+        self, namespace: str, key: Hashable, render: Callable[[], Awaitable[bytes]], tag: Hashable = None
+    ) -> bytes:
+        version = (self._versions.get(namespace, 0), tag)
+        entry = self.bodies.get((namespace, key))
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        body = await render()
+        # Don't store a body rendered from data that was invalidated mid-render
+        if self._versions.get(namespace, 0) == version[0]:
+            self.bodies.set((namespace, key), (version, body))
+        return body
+
+    def invalidate(self, namespace: str) -> None:
+        self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.bodies.stats(), "versions": dict(self._versions)}
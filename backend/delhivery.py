@@ -1,8 +1,13 @@
 import os
+import asyncio
 import requests
 import json
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 class DelhiveryClient:
     """
@@ -10,8 +15,21 @@ class DelhiveryClient:
     """
     BASE_URL = "https://track.delhivery.com"
     STAGING_URL = "https://staging-express.delhivery.com"
+
+    # (connect, read) timeouts in seconds per endpoint; shipment creation and label
+    # rendering are slow on Delhivery's side, lookups should fail fast
+    DEFAULT_TIMEOUT: Tuple[float, float] = (5, 20)
+    ENDPOINT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+        "waybill/api/fetch/json/": (5, 10),
+        "api/cmu/create.json": (5, 30),
+        "api/v1/packages/json/": (5, 10),
+        "api/p-packing-slip": (5, 30),
+        "fm/request/new/": (5, 15),
+        "c/api/pin-codes/json/": (5, 10),
+    }
     
-    def __init__(self, api_key: str = None, client_name: str = None, warehouse_name: str = None, is_production: bool = True):
+    def __init__(self, api_key: str = None, client_name: str = None, warehouse_name: str = None, is_production: bool = True,
+                 base_url: str = None, max_retries: int = None, pool_size: int = 10):
         """
         Initialize the Delhivery client
         """
@@ -27,11 +45,45 @@ class DelhiveryClient:
             "country": "India",
             "phone": os.environ.get("WAREHOUSE_PHONE", "")
         }
-        self.base_url = self.BASE_URL if is_production else self.STAGING_URL
+        self.base_url = (base_url or os.environ.get("DELHIVERY_BASE_URL") or
+                         (self.BASE_URL if is_production else self.STAGING_URL)).rstrip("/")
+        if max_retries is None:
+            max_retries = int(os.environ.get("DELHIVERY_MAX_RETRIES", "3"))
+        self.session = self._build_session(max_retries, pool_size)
         
         if not self.api_key:
             print("Warning: DELHIVERY_API_KEY is not set")
 
+    @staticmethod
+    def _build_session(max_retries: int, pool_size: int) -> requests.Session:
+        """
+        Keep-alive session with bounded, backed-off retries.
+        Connection failures are retried for every method (nothing reached Delhivery);
+        read timeouts and 5xx/429 responses only for GETs so a shipment is never created twice.
+        """
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _timeout(self, endpoint: str) -> Tuple[float, float]:
+        return self.ENDPOINT_TIMEOUTS.get(endpoint, self.DEFAULT_TIMEOUT)
+
+    def close(self):
+        self.session.close()
+
     def _make_request(self, method: str, endpoint: str, data: Dict = None, params: Dict = None, use_json_format_param: bool = False) -> Dict:
         """
         Make a request to the Delhivery API
@@ -51,7 +103,7 @@ class DelhiveryClient:
                 if "token" not in params:
                     params["token"] = self.api_key
                 
-                response = requests.get(url, headers=headers, params=params)
+                response = self.session.get(url, headers=headers, params=params, timeout=self._timeout(endpoint))
             
             elif method.lower() == "post":
                 if use_json_format_param:
@@ -64,9 +116,9 @@ class DelhiveryClient:
                     }
                     # When sending as form data, don't set Content-Type: application/json
                     headers.pop("Content-Type", None) 
-                    response = requests.post(url, headers={"Authorization": f"Token {self.api_key}"}, data=payload)
+                    response = self.session.post(url, headers={"Authorization": f"Token {self.api_key}"}, data=payload, timeout=self._timeout(endpoint))
                 else:
-                    response = requests.post(url, headers=headers, json=data)
+                    response = self.session.post(url, headers=headers, json=data, timeout=self._timeout(endpoint))
             
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
@@ -277,8 +329,9 @@ class DelhiveryClient:
         params = {"wbns": waybill, "pdf": "true"}
         
         try:
-            # We use requests directly here to get raw bytes
-            response = requests.get(url, params=params, headers={"Authorization": f"Token {self.api_key}"})
+            # Bypass _make_request here to get raw bytes
+            response = self.session.get(url, params=params, headers={"Authorization": f"Token {self.api_key}"},
+                                        timeout=self._timeout("api/p-packing-slip"))
             response.raise_for_status()
             return response.content
         except requests.exceptions.RequestException as e:
@@ -302,3 +355,53 @@ class DelhiveryClient:
         Check serviceability for a pincode
         """
         return self._make_request("get", "c/api/pin-codes/json/", params={"filter_codes": pincode})
+
+
+class AsyncDelhiveryClient:
+    """
+    asyncio wrapper around DelhiveryClient for use inside request handlers.
+
+    Calls run on a small dedicated thread pool that shares the client's keep-alive
+    session, so a slow courier API holds a worker thread instead of the event loop.
+    """
+
+    def __init__(self, client: DelhiveryClient, max_concurrency: int = 8):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="delhivery")
+
+    @property
+    def warehouse_name(self) -> Optional[str]:
+        return self.client.warehouse_name
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def fetch_waybill(self, count: int = 1) -> str:
+        return await self._call(self.client.fetch_waybill, count)
+
+    async def create_shipment(self, **kwargs) -> Dict[str, Any]:
+        return await self._call(self.client.create_shipment, **kwargs)
+
+    async def create_return_shipment(self, **kwargs) -> Dict[str, Any]:
+        return await self._call(self.client.create_return_shipment, **kwargs)
+
+    async def track_shipment(self, waybill: str) -> Dict[str, Any]:
+        return await self._call(self.client.track_shipment, waybill)
+
+    async def get_label_pdf(self, waybill: str) -> bytes:
+        return await self._call(self.client.get_label_pdf, waybill)
+
+    async def schedule_pickup(self, **kwargs) -> Dict[str, Any]:
+        return await self._call(self.client.schedule_pickup, **kwargs)
+
+    async def check_serviceability(self, pincode: str) -> Dict[str, Any]:
+        return await self._call(self.client.check_serviceability, pincode)
+
+    def generate_label_url(self, waybill: str) -> str:
+        return self.client.generate_label_url(waybill)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
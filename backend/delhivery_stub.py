@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Delhivery API, for exercising DelhiveryClient without
+touching the real courier. Point the backend at it with:
+
+    python delhivery_stub.py --port 8765 [--delay 2] [--fail-every 3]
+    DELHIVERY_BASE_URL=http://127.0.0.1:8765 uvicorn server:app
+
+--delay slows every response (to test timeouts); --fail-every N answers every
+Nth request with a 503 (to test retries and backoff).
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def make_handler(delay: float = 0.0, fail_every: int = 0):
+    counter = itertools.count(1)
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, payload, status: int = 200):
+            self._send(status, json.dumps(payload).encode())
+
+        def _should_fail(self) -> bool:
+            if delay:
+                time.sleep(delay)
+            return bool(fail_every) and next(counter) % fail_every == 0
+
+        def do_GET(self):
+            if self._should_fail():
+                return self._json({"error": "stub outage"}, status=503)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path.startswith("/waybill/api/fetch/json"):
+                return self._json({"waybill": str(uuid.uuid4().int)[:14]})
+            if url.path.startswith("/api/v1/packages/json"):
+                waybills = ",".join(query.get("waybill", [""])).split(",")
+                return self._json({"ShipmentData": [
+                    {"Shipment": {
+                        "AWB": wb,
+                        "Status": {"Status": "In Transit", "StatusDateTime": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                   "StatusLocation": "Hyderabad_Hub"},
+                        "Scans": [],
+                    }}
+                    for wb in waybills if wb
+                ]})
+            if url.path.startswith("/api/p-packing-slip"):
+                return self._send(200, MINIMAL_PDF, content_type="application/pdf")
+            if url.path.startswith("/c/api/pin-codes/json"):
+                return self._json({"delivery_codes": [{"postal_code": {"pin": query.get("filter_codes", [""])[0]}}]})
+            return self._json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            if self._should_fail():
+                return self._json({"error": "stub outage"}, status=503)
+            url = urlparse(self.path)
+            if url.path.startswith("/api/cmu/create.json"):
+                return self._json({"success": True, "packages": [{"waybill": str(uuid.uuid4().int)[:14], "status": "Success"}]})
+            if url.path.startswith("/fm/request/new"):
+                return self._json({"pickup_id": uuid.uuid4().int % 10**8, "success": True})
+            return self._json({"error": "not found"}, status=404)
+
+    return StubHandler
+
+
+def start_stub_server(port: int = 0, delay: float = 0.0, fail_every: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Run the stub on a background thread; returns the server and its base URL
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(delay, fail_every))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Delhivery API stub")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.fail_every))
+    print(f"Delhivery stub listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStub stopped.")
@@ -0,0 +1,136 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+
+class EventBuffer:
+    """
+    In-memory ingestion buffer for storefront analytics events.
+
+    Requests append documents and return immediately; a background task writes
+    them with insert_many(ordered=False) once `batch_size` events are waiting or
+    every `flush_interval` seconds, whichever comes first. The buffer holds at
+    most `max_size` events: add() refuses a batch that would overflow it so the
+    endpoint can push back, and stop() flushes whatever is left on shutdown. Batches
+    that fail on a transient error are put back for the next flush; `on_flush` only
+    sees events that were actually inserted.
+    """
+
+    def __init__(
+        self,
+        collection: str = "site_analytics",
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_size: int = 20000,
+        on_flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.on_flush = on_flush
+        self.db = None
+        self._events: List[Dict[str, Any]] = []
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.requeued = 0
+        self.flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def add(self, events: List[Dict[str, Any]]) -> bool:
+        if len(self._events) + len(events) > self.max_size:
+            self.rejected += len(events)
+            return False
+        self._events.extend(events)
+        self.accepted += len(events)
+        if len(self._events) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def flush(self) -> int:
+        """
+        Write everything buffered so far; returns the number of events inserted
+        """
+        async with self._flush_lock:
+            if self.db is None or not self._events:
+                return 0
+            events, self._events = self._events, []
+            written: List[Dict[str, Any]] = []
+            retry: List[Dict[str, Any]] = []
+            for i in range(0, len(events), self.batch_size):
+                batch = events[i:i + self.batch_size]
+                try:
+                    await self.db[self.collection].insert_many(batch, ordered=False)
+                    written.extend(batch)
+                except asyncio.CancelledError:
+                    # Shutting down mid-flush: keep the unwritten events for the final flush
+                    self._events = retry + events[i:] + self._events
+                    raise
+                except BulkWriteError as e:
+                    # Unordered: everything except the rejected documents was still inserted
+                    rejected = {error.get("index") for error in e.details.get("writeErrors", [])}
+                    written.extend(event for index, event in enumerate(batch) if index not in rejected)
+                    self.failed += len(rejected)
+                except Exception as e:
+                    print(f"Failed to write {len(batch)} analytics events, retrying on the next flush: {e}")
+                    retry.extend(batch)
+            if retry:
+                # Transient failure (e.g. the database is unreachable): put the events back, within max_size
+                room = max(self.max_size - len(self._events), 0)
+                self._events = retry[:room] + self._events
+                self.requeued += min(len(retry), room)
+                self.failed += max(len(retry) - room, 0)
+            self.written += len(written)
+            self.flushes += 1
+            if self.on_flush and written:
+                self.on_flush(written)
+            return len(written)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Analytics event flush failed: {e}")
+
+    def start(self, db):
+        self.db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._events),
+            "max_size": self.max_size,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "flushes": self.flushes,
+        }
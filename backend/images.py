@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Responsive image variants for uploaded product images.
+
+Each upload is rendered once, at upload time, into a fixed set of widths under
+uploads/variants/<key>/ alongside a manifest.json describing them; /api/image
+then serves the nearest precomputed variant instead of resizing on request.
+
+Backfill variants for uploads that predate the pipeline with:
+
+    python images.py [uploads_dir]
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+try:
+    # Pillow < 11 needs the plugin for AVIF; newer builds may ship it natively
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+from cache import TTLCache
+
+# Named widths rendered for every upload, smallest first
+VARIANT_WIDTHS: Dict[str, int] = {
+    "thumbnail": 200,
+    "card": 400,
+    "detail": 800,
+    "zoom": 1600,
+}
+VARIANT_QUALITY = 85
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+# On-demand sizes and qualities snap to these steps so arbitrary query strings can't explode the cache
+ALLOWED_DIMENSIONS = (64, 100, 150, 200, 300, 400, 500, 600, 800, 1000, 1200, 1600, 2000)
+ALLOWED_QUALITIES = (50, 60, 70, 80, 85, 90)
+ALLOWED_FITS = ("contain", "cover")
+
+Image.init()
+AVIF_SUPPORTED = "AVIF" in Image.SAVE
+WEBP_SUPPORTED = "WEBP" in Image.SAVE
+
+# Output formats by preference: (name, Pillow format, media type, file extension)
+OUTPUT_FORMATS = {
+    "avif": ("AVIF", "image/avif", "avif"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+def supported_formats() -> List[str]:
+    formats = []
+    if AVIF_SUPPORTED:
+        formats.append("avif")
+    if WEBP_SUPPORTED:
+        formats.append("webp")
+    formats.append("jpeg")
+    return formats
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Best output format the client advertises in its Accept header; JPEG otherwise
+    """
+    accept = (accept or "").lower()
+    if AVIF_SUPPORTED and "image/avif" in accept:
+        return "avif"
+    if WEBP_SUPPORTED and "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+
+def encode_image(img: Image.Image, fmt: str, quality: int) -> bytes:
+    """
+    Encode to the named output format; WebP/AVIF keep transparency, JPEG flattens to RGB
+    """
+    pil_format = OUTPUT_FORMATS[fmt][0]
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        img.convert("RGB").save(buf, format=pil_format, quality=quality, optimize=True)
+    else:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        save_kwargs = {"quality": quality}
+        if fmt == "webp":
+            save_kwargs["method"] = 4
+        img.save(buf, format=pil_format, **save_kwargs)
+    return buf.getvalue()
+
+
+def variant_key(relative_path: str) -> str:
+    return hashlib.sha256(relative_path.encode()).hexdigest()[:24]
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Write via a temp file in the same directory and rename, so readers never see a partial file
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render_variants(source_path: str, output_dir: str, widths: Dict[str, int], quality: int, formats: List[str]) -> Dict[str, Any]:
+    """
+    Render every configured width of one source image, in every output format, and write its manifest.
+    Runs inside the pipeline's worker processes, so it must stay a plain module-level function.
+    """
+    source = Path(source_path)
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    img = Image.open(str(source))
+    img.load()
+    variants = []
+    rendered_widths = set()
+    for name, width in sorted(widths.items(), key=lambda item: item[1]):
+        # Never upscale: widths beyond the source collapse onto the original size
+        target_w = min(width, img.width)
+        if target_w in rendered_widths:
+            continue
+        rendered_widths.add(target_w)
+        resized = ImageOps.contain(img, (target_w, img.height))
+        files = {}
+        for fmt in formats:
+            filename = f"{name}.{OUTPUT_FORMATS[fmt][2]}"
+            write_atomic(out / filename, encode_image(resized, fmt, quality))
+            files[fmt] = filename
+        variants.append({"name": name, "width": resized.width, "height": resized.height, "files": files})
+
+    manifest = {
+        "source_mtime": int(source.stat().st_mtime),
+        "width": img.width,
+        "height": img.height,
+        "quality": quality,
+        "variants": variants,
+    }
+    write_atomic(out / "manifest.json", json.dumps(manifest).encode())
+    return manifest
+
+
+def render_transform(source_path: str, cache_path: str, w: Optional[int], h: Optional[int], fit: str, fmt: str, quality: int) -> str:
+    """
+    Resize/crop one source for an on-demand /api/image request and write it to the cache atomically.
+    Runs inside the pipeline's worker processes, so it must stay a plain module-level function.
+    """
+    img = Image.open(source_path)
+    if not w and not h:
+        w = 800
+    if fit == "cover" and w and h:
+        img = ImageOps.fit(img, (w, h))
+    else:
+        # Sizes are quantized upwards, so cap at the source instead of upscaling into the next step
+        target_w = min(w or img.width, img.width)
+        target_h = min(h or img.height, img.height)
+        img = ImageOps.contain(img, (target_w, target_h))
+    path = Path(cache_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, encode_image(img, fmt, quality))
+    return cache_path
+
+
+# Upload names are unique per file, so every derivative URL maps to fixed bytes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def image_etag(basis: str, source_path: Path) -> str:
+    """
+    Strong ETag for a derivative: what was served (variant file or cache key) plus the source's identity
+    """
+    stat = source_path.stat()
+    digest = hashlib.sha256(f"{basis}:{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def quantize_dimension(value: Optional[int]) -> Optional[int]:
+    """
+    Round a requested width/height up to the next allowed step (capped at the largest)
+    """
+    if not value or value <= 0:
+        return None
+    return next((step for step in ALLOWED_DIMENSIONS if step >= value), ALLOWED_DIMENSIONS[-1])
+
+
+def quantize_quality(value: Optional[int]) -> int:
+    if not value:
+        return VARIANT_QUALITY
+    return min(ALLOWED_QUALITIES, key=lambda step: (abs(step - value), -step))
+
+
+class DerivativeCache:
+    """
+    Byte-budgeted cache directory for on-demand /api/image derivatives.
+
+    File mtimes double as last-access times (touched on every hit), so LRU order
+    survives restarts. A background task evicts least recently used files down to
+    `low_water` of the budget, plus anything unused for longer than `max_age`.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, max_age: float = 30 * 86400, interval: float = 300.0, low_water: float = 0.9):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.low_water = low_water
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.size_bytes = 0
+        self.files = 0
+        self.last_eviction_at: Optional[float] = None
+
+    @staticmethod
+    def normalize(w: Optional[int], h: Optional[int], q: Optional[int], fit: Optional[str]) -> Tuple[Optional[int], Optional[int], int, str]:
+        return (
+            quantize_dimension(w),
+            quantize_dimension(h),
+            quantize_quality(q),
+            fit if fit in ALLOWED_FITS else "contain",
+        )
+
+    def lookup(self, path: Path) -> bool:
+        """
+        True if the derivative is cached; refreshes its position in the LRU order
+        """
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith(".tmp-"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Enforce the byte budget and max age; returns the number of files removed
+        """
+        if not self.cache_dir.exists():
+            return 0
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age
+        target = self.max_bytes * self.low_water if total > self.max_bytes else total
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= target and mtime >= cutoff:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            self.evicted_bytes += size
+        self.evictions += removed
+        self.size_bytes = total
+        self.files = len(entries) - removed
+        self.last_eviction_at = time.time()
+        return removed
+
+    async def _evict_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.evict)
+            except Exception as e:
+                print(f"Image cache eviction failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._evict_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size_bytes": self.size_bytes,
+            "files": self.files,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "last_eviction_at": self.last_eviction_at,
+        }
+
+
+class ImagePipeline:
+    """
+    Renders upload-time image variants on a process pool and answers
+    "which precomputed file best serves this request" from their manifests.
+
+    On-demand transforms run on a second, separately bounded pool so a burst of
+    uploads never queues ahead of a shopper's image; identical concurrent requests
+    share a single render.
+    """
+
+    def __init__(
+        self,
+        uploads_dir: Path,
+        widths: Optional[Dict[str, int]] = None,
+        quality: int = VARIANT_QUALITY,
+        max_workers: Optional[int] = None,
+        transform_workers: Optional[int] = None,
+    ):
+        self.uploads_dir = Path(uploads_dir)
+        self.variants_dir = self.uploads_dir / "variants"
+        self.widths = widths or VARIANT_WIDTHS
+        self.quality = quality
+        self.formats = supported_formats()
+        self.max_workers = max_workers or min(2, os.cpu_count() or 1)
+        self.transform_workers = transform_workers or min(4, os.cpu_count() or 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._transform_executor: Optional[ProcessPoolExecutor] = None
+        self._transforms: Dict[str, "asyncio.Future[str]"] = {}
+        self._jobs: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._manifests = TTLCache(4096, 300, name="image_manifests")
+        self.rendered = 0
+        self.failed = 0
+        self.variant_hits = 0
+        self.variant_misses = 0
+        self.transforms = 0
+        self.transforms_coalesced = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _get_transform_executor(self) -> ProcessPoolExecutor:
+        if self._transform_executor is None:
+            self._transform_executor = ProcessPoolExecutor(
+                max_workers=self.transform_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._transform_executor
+
+    @staticmethod
+    def is_image(relative_path: str) -> bool:
+        return Path(relative_path).suffix.lower() in IMAGE_SUFFIXES
+
+    def variant_dir(self, relative_path: str) -> Path:
+        return self.variants_dir / variant_key(relative_path)
+
+    async def _generate(self, relative_path: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        source_path = self.uploads_dir / relative_path
+        try:
+            manifest = await loop.run_in_executor(
+                self._get_executor(), render_variants,
+                str(source_path), str(self.variant_dir(relative_path)), self.widths, self.quality, self.formats
+            )
+        except BrokenProcessPool as e:
+            self._executor = None
+            print(f"Image worker crashed while rendering {relative_path}: {e}")
+            manifest = None
+        except Exception as e:
+            print(f"Failed to render image variants for {relative_path}: {e}")
+            manifest = None
+        if manifest:
+            self.rendered += 1
+            self._manifests.set(relative_path, manifest)
+        else:
+            self.failed += 1
+        return manifest
+
+    async def generate(self, relative_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Render variants for one upload, joining the in-flight job if there is one
+        """
+        job = self._jobs.get(relative_path)
+        if job is None:
+            job = asyncio.ensure_future(self._generate(relative_path))
+            self._jobs[relative_path] = job
+            job.add_done_callback(lambda _: self._jobs.pop(relative_path, None))
+        return await asyncio.shield(job)
+
+    def enqueue(self, relative_path: str, missing_only: bool = False) -> None:
+        """
+        Start rendering variants in the background, if the upload is an image;
+        with `missing_only`, skip it when its variants are already current
+        """
+        if not self.is_image(relative_path):
+            return
+        if missing_only and self.load_manifest(relative_path, self.uploads_dir / relative_path) is not None:
+            return
+        task = asyncio.create_task(self.generate(relative_path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _transform(self, source_path: Path, cache_path: Path, w: Optional[int], h: Optional[int], fit: str, fmt: str, quality: int) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._get_transform_executor(), render_transform,
+                str(source_path), str(cache_path), w, h, fit, fmt, quality
+            )
+        except BrokenProcessPool:
+            self._transform_executor = None
+            raise
+        self.transforms += 1
+        return result
+
+    async def transform(self, source_path: Path, cache_path: Path, w: Optional[int], h: Optional[int], fit: str, fmt: str, quality: int) -> Path:
+        """
+        Render an on-demand derivative into `cache_path`; concurrent calls for the same path await one render
+        """
+        key = str(cache_path)
+        job = self._transforms.get(key)
+        if job is None:
+            job = asyncio.ensure_future(self._transform(source_path, cache_path, w, h, fit, fmt, quality))
+            self._transforms[key] = job
+            job.add_done_callback(lambda _: self._transforms.pop(key, None))
+        else:
+            self.transforms_coalesced += 1
+        return Path(await asyncio.shield(job))
+
+    def load_manifest(self, relative_path: str, source_path: Path) -> Optional[Dict[str, Any]]:
+        """
+        The variant manifest for a source, or None if missing or older than the source
+        """
+        manifest = self._manifests.get(relative_path)
+        if manifest is None:
+            manifest_path = self.variant_dir(relative_path) / "manifest.json"
+            try:
+                manifest = json.loads(manifest_path.read_bytes())
+            except (OSError, ValueError):
+                return None
+            self._manifests.set(relative_path, manifest)
+        try:
+            if manifest.get("source_mtime") != int(source_path.stat().st_mtime):
+                return None
+        except OSError:
+            return None
+        return manifest
+
+    def nearest_variant(self, relative_path: str, source_path: Path, w: Optional[int], h: Optional[int], fit: str, fmt: str = "jpeg") -> Optional[Path]:
+        """
+        Smallest precomputed variant at least `w` wide (or the largest one) in format `fmt`,
+        for width-only requests. Box-constrained or cropped requests still go through the
+        on-demand resizer.
+        """
+        if h:
+            return None
+        manifest = self.load_manifest(relative_path, source_path)
+        if not manifest or not manifest.get("variants"):
+            self.variant_misses += 1
+            return None
+        target = w or VARIANT_WIDTHS["detail"]
+        variants = sorted(manifest["variants"], key=lambda v: v["width"])
+        chosen = next((v for v in variants if v["width"] >= target), variants[-1])
+        filename = chosen.get("files", {}).get(fmt)
+        path = self.variant_dir(relative_path) / filename if filename else None
+        if path is None or not path.exists():
+            self.variant_misses += 1
+            return None
+        self.variant_hits += 1
+        return path
+
+    def shutdown(self) -> None:
+        for executor in (self._executor, self._transform_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._transform_executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "widths": self.widths,
+            "formats": self.formats,
+            "in_flight": len(self._jobs),
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "variant_hits": self.variant_hits,
+            "variant_misses": self.variant_misses,
+            "transform_workers": self.transform_workers,
+            "transforms_in_flight": len(self._transforms),
+            "transforms": self.transforms,
+            "transforms_coalesced": self.transforms_coalesced,
+        }
+
+
+if __name__ == "__main__":
+    uploads = Path(sys.argv[1] if len(sys.argv) > 1 else Path(__file__).parent / "uploads").resolve()
+    pipeline = ImagePipeline(uploads)
+    sources = [p for p in sorted(uploads.iterdir()) if p.is_file() and pipeline.is_image(p.name)]
+    print(f"Rendering variants for {len(sources)} images in {uploads}")
+    for source in sources:
+        if pipeline.load_manifest(source.name, source):
+            continue
+        try:
+            render_variants(str(source), str(pipeline.variant_dir(source.name)), pipeline.widths, pipeline.quality, pipeline.formats)
+            print(f"  {source.name}")
+        except Exception as e:
+            print(f"  {source.name}: failed ({e})")
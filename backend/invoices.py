@@ -0,0 +1,490 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import qrcode
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, A6, landscape, portrait
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as PlatypusImage, KeepInFrame, Flowable
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch, mm, cm
+    from reportlab.graphics.barcode import code128
+    from reportlab.graphics.shapes import Drawing 
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
+    REPORTLAB_AVAILABLE = True
+except Exception:
+    REPORTLAB_AVAILABLE = False
+
+
+def render_order_label(order: Dict, output_dir: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Build the combined shipping label / tax invoice PDF for an order.
+    Runs inside the renderer's worker processes, so it must stay a plain module-level function.
+    """
+    if not REPORTLAB_AVAILABLE:
+        print("ReportLab is not available. Cannot generate PDF.")
+        return None, "ReportLab library is not available"
+
+    try:
+        filename = f"label_{order['order_number']}.pdf"
+        filepath = Path(output_dir) / filename
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Build into a temp file and rename so readers never see a half-written PDF
+        tmp_path = filepath.with_name(f".{filename}.{os.getpid()}.tmp")
+        
+        # A4 page size
+        doc = SimpleDocTemplate(
+            str(tmp_path), 
+            pagesize=A4,
+            leftMargin=0.5*inch,
+            rightMargin=0.5*inch,
+            topMargin=0.5*inch,
+            bottomMargin=0.5*inch
+        )
+        elements = []
+        styles = getSampleStyleSheet()
+        
+        # Custom Styles
+        style_normal = styles["Normal"]
+        style_normal.fontName = "Helvetica"
+        style_normal.fontSize = 8
+        style_normal.leading = 10
+        
+        style_bold = ParagraphStyle(
+            'Bold',
+            parent=style_normal,
+            fontName="Helvetica-Bold",
+        )
+        
+        style_title = ParagraphStyle(
+            'TitleCustom',
+            parent=styles["Title"],
+            fontName="Helvetica-Bold",
+            fontSize=16,
+            alignment=TA_LEFT,
+            spaceAfter=5
+        )
+
+        style_center = ParagraphStyle(
+            'Center',
+            parent=style_normal,
+            alignment=TA_CENTER
+        )
+
+        # Helper to create QR code image
+        def create_qr_code(data):
+            if not data:
+                return None
+            qr = qrcode.QRCode(box_size=10, border=1)
+            qr.add_data(data)
+            qr.make(fit=True)
+            img = qr.make_image(fill_color="black", back_color="white")
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")
+            buf.seek(0)
+            return PlatypusImage(buf, width=1.0*inch, height=1.0*inch)
+
+        # Helper to create Barcode
+        def create_barcode(data):
+            if not data:
+                return None
+            barcode = code128.Code128(data, barHeight=0.5*inch, barWidth=1.2, humanReadable=True)
+            if isinstance(barcode, Flowable):
+                return barcode
+            else:
+                d = Drawing(150, 40)
+                d.add(barcode)
+                return d
+
+        # --- Data Extraction ---
+        shipping = order.get('shipping_address', {})
+        waybill = order.get('delhivery_waybill') or order.get('order_number')
+        # Format: City_Temp1_L (mock pattern from image)
+        city = shipping.get('city', 'City').split()[0] if shipping.get('city') else 'City'
+        dest_code = f"{city}_Temp1_L"
+        pincode = shipping.get('pincode', '000000')
+        return_code = f"{pincode},3733369"
+        
+        # --- Top Section: Shipping Label ---
+        
+        # Left Column: Customer Address
+        customer_address_html = f"""
+        <b>Customer Address</b><br/>
+        <b>{shipping.get('name', 'Customer Name')}</b><br/>
+        {shipping.get('address') or shipping.get('street') or shipping.get('line1') or ''}<br/>
+        {shipping.get('city', '')}, {shipping.get('state', '')}, {shipping.get('pincode', '')}<br/>
+        Phone: {shipping.get('phone', '')}
+        """
+        
+        # "If undelivered, return to"
+        return_address_html = """
+        <b>If undelivered, return to:</b><br/>
+        <b>Mirvaa Fashions</b><br/>
+        P NO 16, F NO 102, MARUTHI RESIDENCY,<br/>
+        GOUTHAM NAGAR KRISHNA NAGAR<br/>
+        COLONY, Hyderabad<br/>
+        Near Oxford school<br/>
+        Rangareddy, Telangana, 500074
+        """
+        
+        left_col_content = [
+            Paragraph(customer_address_html, style_normal),
+            Spacer(1, 10),
+            Paragraph(return_address_html, style_normal)
+        ]
+
+        # Right Column: Delhivery Info
+        # COD Bar
+        cod_amount = order.get('total', 0)
+        # Assuming COD if payment_method is cod, else Prepaid
+        payment_method = order.get('payment_method', 'prepaid').lower()
+        if payment_method == 'cod':
+            cod_text = "COD: Check the payable amount on the app"
+            cod_bg = colors.black
+            cod_fg = colors.white
+        else:
+            cod_text = "PREPAID"
+            cod_bg = colors.white
+            cod_fg = colors.black
+
+        cod_style = ParagraphStyle(
+            'COD',
+            parent=style_normal,
+            textColor=cod_fg,
+            backColor=cod_bg,
+            alignment=TA_CENTER,
+            fontSize=10,
+            leading=14,
+            fontName="Helvetica-Bold"
+        )
+        
+        # QR Code
+        qr_img = create_qr_code(waybill)
+        
+        # Barcode
+        barcode_drawing = create_barcode(waybill)
+
+        right_col_content = [
+            Paragraph(cod_text, cod_style),
+            Spacer(1, 5),
+            Table([
+                [
+                    [
+                        Paragraph("<b>Delhivery</b>", style_title),
+                        Paragraph('<font backColor="black" color="white"> Pickup </font>', style_normal),
+                        Spacer(1, 5),
+                        Paragraph("Destination Code", style_normal),
+                        Paragraph(f"<b>{dest_code}</b>", style_bold),
+                        Paragraph(f"({shipping.get('state', '')})", style_normal),
+                        Spacer(1, 5),
+                        Paragraph("Return Code", style_normal),
+                        Paragraph(f"<b>{return_code}</b>", style_bold),
+                    ],
+                    qr_img
+                ]
+            ], colWidths=[2.0*inch, 1.2*inch], style=TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP')])),
+            Spacer(1, 5),
+            Paragraph(f"<b>{waybill}</b>", style_center),
+            barcode_drawing
+        ]
+
+        # Main Label Table
+        label_table = Table(
+            [[left_col_content, right_col_content]],
+            colWidths=[3.5*inch, 3.8*inch],
+        )
+        label_table.setStyle(TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('INNERGRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+            ('LEFTPADDING', (0, 0), (-1, -1), 5),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+        ]))
+        elements.append(label_table)
+
+        # --- Product Details Strip ---
+        # SKU | Size | Qty | Color | Order No.
+        first_item = order['items'][0] if order['items'] else {}
+        prod_sku = first_item.get('sku', first_item.get('product_id', 'N/A')[:8])
+        prod_size = first_item.get('size', 'N/A')
+        prod_qty = str(sum(item.get('quantity', 1) for item in order['items']))
+        prod_color = first_item.get('color', 'N/A')
+        
+        prod_data = [
+            ["Product Details"],
+            ["SKU", "Size", "Qty", "Color", "Order No."],
+            [prod_sku, prod_size, prod_qty, prod_color, order['order_number']]
+        ]
+        
+        prod_table = Table(prod_data, colWidths=[1.5*inch, 0.8*inch, 0.8*inch, 1.0*inch, 3.2*inch])
+        prod_table.setStyle(TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black), # Under header
+            ('SPAN', (0, 0), (-1, 0)), # Span "Product Details"
+            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ]))
+        elements.append(prod_table)
+        elements.append(Spacer(1, 10))
+
+        # --- Tax Invoice Section ---
+        
+        # Invoice Header
+        inv_header_data = [[
+            Paragraph("<b>TAX INVOICE</b>", style_center),
+            Paragraph("Original For Recipient", ParagraphStyle('Right', parent=style_normal, alignment=TA_RIGHT))
+        ]]
+        inv_header_table = Table(inv_header_data, colWidths=[3.65*inch, 3.65*inch])
+        inv_header_table.setStyle(TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]))
+        elements.append(inv_header_table)
+
+        # Invoice Meta Data (Bill To / Ship To / Sold By / Dates)
+        bill_to_html = f"""
+        <b>BILL TO / SHIP TO</b><br/>
+        {shipping.get('name', '')}, {shipping.get('address', '')},<br/>
+        {shipping.get('city', '')}, {shipping.get('state', '')}, {shipping.get('pincode', '')}<br/>
+        Place of Supply: {shipping.get('state', '')}
+        """
+        
+        sold_by_html = """
+        <b>Sold By : MANIKANTI VINAY KUMAR</b><br/>
+        Mirvaa Fashions, P NO 16 F NO 102 MARUTHI RESIDENCY GOUTHAM NAGAR KRISHNA NAGAR COLONY , Rangareddy, Telangana, 500074<br/>
+        <b>GSTIN - 36BWFPM1923G1ZN</b>
+        """
+        
+        created_dt = datetime.fromisoformat(order['created_at'].replace('Z', '+00:00')) if isinstance(order.get('created_at'), str) else order.get('created_at', datetime.now())
+        order_date_str = created_dt.strftime("%d.%m.%Y")
+        invoice_no = order.get('order_number')[-8:] 
+        
+        right_sub_table = Table([
+            [Paragraph(sold_by_html, style_normal)],
+            [
+                 Table([
+                    ["Purchase Order No.", "Invoice No.", "Order Date", "Invoice Date"],
+                    [order['order_number'][:15], invoice_no, order_date_str, order_date_str]
+                ], colWidths=[1.4*inch, 0.8*inch, 0.7*inch, 0.7*inch], style=TableStyle([
+                    ('FONTSIZE', (0,0), (-1,-1), 6),
+                    ('FONTNAME', (0,1), (-1,1), 'Helvetica-Bold'),
+                    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+                ]))
+            ]
+        ], colWidths=[3.65*inch])
+        right_sub_table.setStyle(TableStyle([
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('LEFTPADDING', (0,0), (-1,-1), 0),
+            ('RIGHTPADDING', (0,0), (-1,-1), 0),
+            ('TOPPADDING', (0,0), (-1,-1), 0),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 0),
+        ]))
+
+        meta_container = Table([
+            [Paragraph(bill_to_html, style_normal), right_sub_table]
+        ], colWidths=[3.65*inch, 3.65*inch])
+        
+        meta_container.setStyle(TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('INNERGRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]))
+        elements.append(meta_container)
+
+        # --- Items Table ---
+        items_header = ["Description", "HSN", "Qty", "Gross Amount", "Discount", "Taxable Value", "Taxes", "Total"]
+        items_data = [items_header]
+        
+        total_taxable = 0
+        total_taxes = 0
+        final_total = 0
+        
+        for item in order['items']:
+            qty = item.get('quantity', 1)
+            price = float(item.get('price', 0)) 
+            # Back calculate tax (5% GST assumed from image)
+            tax_rate = 0.05
+            base_price = price / (1 + tax_rate)
+            tax_amount = price - base_price
+            
+            gross = price * qty
+            discount = 0 
+            taxable = base_price * qty
+            total_tax_item = tax_amount * qty
+            item_total = gross - discount 
+            
+            total_taxable += taxable
+            total_taxes += total_tax_item
+            final_total += item_total
+
+            items_data.append([
+                Paragraph(item.get('product_title', 'Item'), style_normal),
+                "6205", 
+                str(qty),
+                f"Rs.{gross:.2f}",
+                f"Rs.{discount}",
+                f"Rs.{taxable:.2f}",
+                f"IGST @5.0%\nRs.{total_tax_item:.2f}",
+                f"Rs.{item_total:.2f}"
+            ])
+            
+        shipping_cost = float(order.get('shipping_cost', 0) or order.get('shipping', 0))
+        if shipping_cost > 0:
+             # Assuming shipping is inclusive of tax or exempt? 
+             # Usually shipping attracts 18% GST but for simplicity matching 5% or treating as exempt if not specified.
+             # User said: "product price is 499, shipping is 50, total 549".
+             # If we treat 50 as gross, we can back calculate or just add it.
+             # Let's treat it as a line item.
+             base_ship = shipping_cost / 1.05
+             tax_ship = shipping_cost - base_ship
+             items_data.append([
+                "Shipping Charges", "9965", "NA", 
+                f"Rs.{shipping_cost:.2f}", "Rs.0", 
+                f"Rs.{base_ship:.2f}", 
+                f"IGST @5.0%\nRs.{tax_ship:.2f}", 
+                f"Rs.{shipping_cost:.2f}"
+             ])
+             total_taxable += base_ship
+             total_taxes += tax_ship
+             final_total += shipping_cost
+
+        # Total Row
+        items_data.append([
+            "Total", "", "", "", "", "", f"Rs.{total_taxes:.2f}", f"Rs.{final_total:.2f}"
+        ])
+
+        items_table = Table(items_data, colWidths=[2.3*inch, 0.5*inch, 0.4*inch, 0.9*inch, 0.7*inch, 0.9*inch, 0.8*inch, 0.8*inch])
+        items_table.setStyle(TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('INNERGRID', (0, 0), (-1, -2), 0.5, colors.grey), # Grid for items
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black), # Header line
+            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black), # Total line top
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
+             ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'), # Bold Total
+        ]))
+        elements.append(items_table)
+        
+        # Disclaimer
+        disclaimer = "Tax is not payable on reverse charge basis. This is a computer generated invoice and does not require signature. Other charges are charges that are applicable to your order and include charges for logistics fee (where applicable). Includes discounts for your city and/or for online payments (as applicable)"
+        elements.append(Table([[Paragraph(disclaimer, ParagraphStyle('Disc', parent=style_normal, fontSize=6))]], style=TableStyle([
+            ('BOX', (0,0), (-1,-1), 1, colors.black),
+            ('TOPPADDING', (0,0), (-1,-1), 2),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 2),
+        ])))
+
+        doc.build(elements)
+        os.replace(tmp_path, filepath)
+        return str(filepath), None
+    except Exception as e:
+        print(f"Error generating PDF label: {e}")
+        import traceback
+        traceback.print_exc()
+        return None, str(e)
+
+
+class InvoiceRenderer:
+    """
+    Renders order label/invoice PDFs on a process pool, off the request path.
+
+    At most one render per order runs at a time: a second request for the same order
+    awaits the job already in flight instead of rendering the PDF again.
+    """
+
+    def __init__(self, output_dir: Path, max_workers: Optional[int] = None):
+        self.output_dir = Path(output_dir)
+        self.max_workers = max_workers or min(2, os.cpu_count() or 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, "asyncio.Future[Tuple[Optional[str], Optional[str]]]"] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps the workers free of the event loop's threads and sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _render(self, order: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        loop = asyncio.get_running_loop()
+        payload = {key: value for key, value in order.items() if key != "_id"}
+        try:
+            path, error = await loop.run_in_executor(
+                self._get_executor(), render_order_label, payload, str(self.output_dir)
+            )
+        except BrokenProcessPool as e:
+            # A crashed worker poisons the pool; start a fresh one for the next job
+            self._executor = None
+            path, error = None, f"PDF worker crashed: {e}"
+        except Exception as e:
+            path, error = None, str(e)
+        if path:
+            self.completed += 1
+        else:
+            self.failed += 1
+        return path, error
+
+    async def render(self, order: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Render the PDF for an order, joining the in-flight job if there is one
+        """
+        order_id = order.get("id") or order.get("order_number")
+        job = self._jobs.get(order_id)
+        if job is None:
+            job = asyncio.ensure_future(self._render(order))
+            self._jobs[order_id] = job
+            job.add_done_callback(lambda _: self._jobs.pop(order_id, None))
+        return await asyncio.shield(job)
+
+    def enqueue(
+        self,
+        order: Dict[str, Any],
+        on_done: Optional[Callable[[Optional[str], Optional[str]], Awaitable[None]]] = None,
+    ) -> None:
+        """
+        Start rendering in the background; on_done receives (path, error) when finished
+        """
+        async def run():
+            path, error = await self.render(order)
+            if on_done is not None:
+                try:
+                    await on_done(path, error)
+                except Exception as e:
+                    print(f"Error storing rendered invoice for {order.get('id')}: {e}")
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
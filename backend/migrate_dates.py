@@ -0,0 +1,123 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from rollups import day_start
+
+# Collection -> date fields that older code stored as ISO strings
+DATE_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at", "password_reset_expires_at"],
+    "admins": ["created_at"],
+    "products": ["created_at", "updated_at"],
+    "orders": ["created_at", "updated_at", "delivered_at", "tracking_synced_at"],
+    "cart": ["created_at"],
+    "wishlist": ["created_at"],
+    "returns": ["created_at", "pickup_scheduled_at"],
+    "reviews": ["created_at"],
+    "cms_pages": ["created_at", "updated_at"],
+    "audit_logs": ["created_at"],
+    "notifications": ["created_at"],
+    "site_analytics": ["created_at"],
+    "email_verifications": ["verified_at", "expires_at"],
+    "email_otps": ["expires_at", "last_sent_at"],
+}
+
+# Fields daily_stats is bucketed by; days built while these were strings came out empty
+ROLLUP_SOURCES = {("orders", "created_at"), ("site_analytics", "created_at")}
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    """
+    ISO string as written by `.isoformat()` (or a JS client) -> aware UTC datetime
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+async def migrate_field(
+    db, collection: str, field: str, batch_size: int = 500, converted_dates: Optional[List[datetime]] = None
+) -> Dict[str, int]:
+    converted = 0
+    skipped = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await db[collection].find(query, {field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        ops = []
+        for doc in docs:
+            parsed = parse_date(doc[field])
+            if parsed is None:
+                skipped += 1
+                continue
+            # Only rewrite if the value is still the string we read, so concurrent writers win
+            ops.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: parsed}}))
+            if converted_dates is not None:
+                converted_dates.append(parsed)
+        if ops:
+            result = await db[collection].bulk_write(ops, ordered=False)
+            converted += result.modified_count
+        if len(docs) < batch_size:
+            break
+        # Yield between batches so an online run doesn't starve request handlers
+        await asyncio.sleep(0)
+    return {"converted": converted, "skipped": skipped}
+
+
+async def migrate(db, batch_size: int = 500) -> Dict[str, Dict[str, int]]:
+    """
+    Rewrite string-typed date fields as native BSON dates, batch by batch.
+
+    Safe to run while the app is serving: it only touches documents whose field is
+    still a string, and re-running it is a no-op once everything is converted.
+    daily_stats documents for days whose orders/events were converted are dropped
+    so the rollup loop rebuilds them from the now-dated records.
+    """
+    summary: Dict[str, Dict[str, int]] = {}
+    for collection, fields in DATE_FIELDS.items():
+        for field in fields:
+            converted_dates: Optional[List[datetime]] = [] if (collection, field) in ROLLUP_SOURCES else None
+            try:
+                result = await migrate_field(db, collection, field, batch_size, converted_dates)
+            except Exception as e:
+                print(f"Date migration failed for {collection}.{field}: {e}")
+                continue
+            if converted_dates:
+                stale_days = sorted({day_start(value) for value in converted_dates})
+                try:
+                    await db.daily_stats.delete_many({"_id": {"$in": stale_days}})
+                except Exception as e:
+                    print(f"Failed to drop {len(stale_days)} stale daily_stats days: {e}")
+            if result["converted"] or result["skipped"]:
+                summary[f"{collection}.{field}"] = result
+    return summary
+
+
+async def main():
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    db = client[os.environ.get("DB_NAME", "mirvaa_fashions")]
+    summary = await migrate(db)
+    if not summary:
+        print("No string dates left to migrate")
+    for key, result in summary.items():
+        print(f"  {key}: {result['converted']} converted, {result['skipped']} unparseable")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
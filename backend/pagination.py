@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+# Sort spec as passed to motor: [(field, 1 | -1), ...]
+SortSpec = List[Tuple[str, int]]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    if isinstance(value, dict) and "$oid" in value:
+        return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    """
+    Opaque, URL-safe cursor; datetimes and ObjectIds round-trip as themselves so they compare like the stored values
+    """
+    data = json.dumps({key: _encode_value(value) for key, value in payload.items()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise InvalidCursor("Invalid pagination cursor") from e
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Invalid pagination cursor")
+    return {key: _decode_value(value) for key, value in payload.items()}
+
+
+def with_tiebreaker(sort: Optional[SortSpec], field: str = "id") -> SortSpec:
+    """
+    Append a unique field so the sort order is total and every row has exactly one position
+    """
+    sort = list(sort or [])
+    if not any(name == field for name, _ in sort):
+        sort.append((field, sort[-1][1] if sort else 1))
+    return sort
+
+
+def cursor_from(document: Dict[str, Any], sort: SortSpec) -> str:
+    """
+    Cursor pointing just past `document`, built from its raw (unnormalized) sort key values
+    """
+    return encode_cursor({field: document.get(field) for field, _ in sort})
+
+
+def keyset_filter(sort: SortSpec, position: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Filter selecting the rows that sort strictly after `position`, e.g. for
+    [(created_at, -1), (id, -1)]: created_at < c OR (created_at == c AND id < i)
+    """
+    missing = [field for field, _ in sort if field not in position]
+    if missing:
+        raise InvalidCursor("Pagination cursor does not match the requested sort")
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: position[prev_field] for prev_field, _ in sort[:i]}
+        clause[field] = {"$lt" if direction < 0 else "$gt": position[field]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def apply_cursor(query: Dict[str, Any], sort: SortSpec, token: Optional[str]) -> Dict[str, Any]:
+    """
+    Combine a listing query with the keyset condition for `token` (if any)
+    """
+    if not token:
+        return query
+    condition = keyset_filter(sort, decode_cursor(token))
+    if not query:
+        return condition
+    return {"$and": [query, condition]}
@@ -0,0 +1,360 @@
+import asyncio
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo import ReplaceOne
+
+EVENT_TYPES = ["page_view", "product_view", "click"]
+# Top-N lists kept per day; dashboards merge days and re-rank
+MAX_DAILY_PAGES = 200
+MAX_DAILY_PRODUCTS = 200
+BACKFILL_CHUNK_DAYS = 31
+
+
+def day_start(value: datetime) -> datetime:
+    # Naive values (e.g. from a client without tz_aware) are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return datetime.combine(value.astimezone(timezone.utc).date(), dt_time.min, tzinfo=timezone.utc)
+
+
+class DailyRollups:
+    """
+    Per-day aggregates of orders and storefront events in `daily_stats`.
+
+    Each document (_id = UTC midnight) holds order counts by status and payment
+    method, revenue, cancellations, category revenue and page/product view counts
+    for that day. A background loop recomputes today every `interval` seconds,
+    plus any earlier day that was touched (e.g. a status change on an older order)
+    or whose orders were updated by any worker since the previous pass.
+    Dashboards read at most one document per day.
+    """
+
+    def __init__(self, interval: float = 60.0, debounce: float = 2.0):
+        self.interval = interval
+        self.debounce = debounce
+        self.db = None
+        self._dirty: Set[datetime] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.last_refresh: Optional[datetime] = None
+        self.days_rebuilt = 0
+
+    def touch(self, when: datetime) -> None:
+        """
+        Mark the day containing `when` for recomputation. Today is rebuilt every
+        interval anyway, so only earlier days are recorded (and wake the loop).
+        """
+        day = day_start(when)
+        if day >= day_start(datetime.now(timezone.utc)):
+            return
+        self._dirty.add(day)
+        self._wake.set()
+
+    def _order_pipeline(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        day = {"$dateTrunc": {"date": "$created_at", "unit": "day"}}
+        live = {"$ne": ["$status", "cancelled"]}
+        return [
+            {"$match": {"created_at": {"$gte": start, "$lt": end}}},
+            {"$facet": {
+                "totals": [
+                    {"$group": {
+                        "_id": day,
+                        "orders": {"$sum": 1},
+                        "cancelled": {"$sum": {"$cond": [live, 0, 1]}},
+                        "revenue": {"$sum": {"$cond": [live, "$total", 0]}},
+                    }},
+                ],
+                "statuses": [
+                    {"$group": {"_id": {"day": day, "status": "$status"}, "count": {"$sum": 1}}},
+                ],
+                "payments": [
+                    {"$group": {
+                        "_id": {"day": day, "method": "$payment_method"},
+                        "count": {"$sum": 1},
+                        "revenue": {"$sum": {"$cond": [live, "$total", 0]}},
+                    }},
+                ],
+                "categories": [
+                    {"$match": {"status": {"$ne": "cancelled"}}},
+                    {"$unwind": "$items"},
+                    {"$lookup": {
+                        "from": "products",
+                        "localField": "items.product_id",
+                        "foreignField": "id",
+                        "as": "product",
+                    }},
+                    {"$unwind": "$product"},
+                    {"$group": {
+                        "_id": {"day": day, "category": "$product.category"},
+                        "revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}},
+                        "items": {"$sum": 1},
+                    }},
+                ],
+            }},
+        ]
+
+    def _event_pipeline(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        day = {"$dateTrunc": {"date": "$created_at", "unit": "day"}}
+        return [
+            {"$match": {"created_at": {"$gte": start, "$lt": end}}},
+            {"$facet": {
+                "types": [
+                    {"$group": {"_id": {"day": day, "type": "$event_type"}, "count": {"$sum": 1}}},
+                ],
+                "pages": [
+                    {"$group": {"_id": {"day": day, "page": "$page"}, "visits": {"$sum": 1}}},
+                    {"$sort": {"visits": -1}},
+                ],
+                "products": [
+                    {"$match": {"product_id": {"$ne": None}}},
+                    {"$group": {"_id": {"day": day, "product_id": "$product_id"}, "visits": {"$sum": 1}}},
+                    {"$sort": {"visits": -1}},
+                ],
+            }},
+        ]
+
+    @staticmethod
+    def _empty_day(day: datetime) -> Dict[str, Any]:
+        return {
+            "_id": day,
+            "orders": 0,
+            "cancelled": 0,
+            "revenue": 0,
+            "statuses": [],
+            "payments": [],
+            "categories": [],
+            "events": {event_type: 0 for event_type in EVENT_TYPES},
+            "pages": [],
+            "products": [],
+        }
+
+    async def rebuild(self, start: datetime, end: datetime) -> int:
+        """
+        Recompute every day in [start, end) from orders and site_analytics; returns days written
+        """
+        start, end = day_start(start), day_start(end)
+        if end <= start:
+            end = start + timedelta(days=1)
+        orders_result, events_result = await asyncio.gather(
+            self.db.orders.aggregate(self._order_pipeline(start, end)).to_list(1),
+            self.db.site_analytics.aggregate(self._event_pipeline(start, end)).to_list(1),
+        )
+        orders = orders_result[0] if orders_result else {}
+        events = events_result[0] if events_result else {}
+
+        days: Dict[datetime, Dict[str, Any]] = {}
+        current = start
+        while current < end:
+            days[current] = self._empty_day(current)
+            current += timedelta(days=1)
+
+        def bucket(value: Any) -> Optional[Dict[str, Any]]:
+            return days.get(day_start(value)) if isinstance(value, datetime) else None
+
+        for row in orders.get("totals", []):
+            doc = bucket(row["_id"])
+            if doc:
+                doc.update(orders=row["orders"], cancelled=row["cancelled"], revenue=row["revenue"])
+        for row in orders.get("statuses", []):
+            doc = bucket(row["_id"].get("day"))
+            if doc:
+                doc["statuses"].append({"status": row["_id"].get("status"), "count": row["count"]})
+        for row in orders.get("payments", []):
+            doc = bucket(row["_id"].get("day"))
+            if doc:
+                doc["payments"].append({"method": row["_id"].get("method"), "count": row["count"], "revenue": row["revenue"]})
+        for row in orders.get("categories", []):
+            doc = bucket(row["_id"].get("day"))
+            if doc:
+                doc["categories"].append({"name": row["_id"].get("category"), "revenue": row["revenue"], "items": row["items"]})
+        for row in events.get("types", []):
+            doc = bucket(row["_id"].get("day"))
+            if doc and row["_id"].get("type") in doc["events"]:
+                doc["events"][row["_id"]["type"]] = row["count"]
+        for row in events.get("pages", []):
+            doc = bucket(row["_id"].get("day"))
+            if doc and len(doc["pages"]) < MAX_DAILY_PAGES:
+                doc["pages"].append({"page": row["_id"].get("page"), "visits": row["visits"]})
+        for row in events.get("products", []):
+            doc = bucket(row["_id"].get("day"))
+            if doc and len(doc["products"]) < MAX_DAILY_PRODUCTS:
+                doc["products"].append({"product_id": row["_id"].get("product_id"), "visits": row["visits"]})
+
+        refreshed_at = datetime.now(timezone.utc)
+        ops = [ReplaceOne({"_id": day}, {**doc, "refreshed_at": refreshed_at}, upsert=True) for day, doc in days.items()]
+        if ops:
+            await self.db.daily_stats.bulk_write(ops, ordered=False)
+        self.days_rebuilt += len(ops)
+        return len(ops)
+
+    async def rebuild_days(self, days: Iterable[datetime]) -> int:
+        written = 0
+        for day in sorted(set(days)):
+            written += await self.rebuild(day, day + timedelta(days=1))
+        return written
+
+    async def _changed_days(self, since: datetime) -> Set[datetime]:
+        """
+        Days whose orders were written since `since` by any process, via the updated_at index
+        """
+        pipeline = [
+            {"$match": {"updated_at": {"$gte": since}}},
+            {"$group": {"_id": {"$dateTrunc": {"date": "$created_at", "unit": "day"}}}},
+        ]
+        rows = await self.db.orders.aggregate(pipeline).to_list(None)
+        return {day_start(row["_id"]) for row in rows if isinstance(row.get("_id"), datetime)}
+
+    async def refresh(self) -> int:
+        async with self._lock:
+            now = datetime.now(timezone.utc)
+            # Today always changes (events from every worker land there); overlap the window slightly
+            days = {day_start(now)}
+            days.update(self._dirty)
+            self._dirty.clear()
+            if self.last_refresh is not None:
+                since = self.last_refresh - timedelta(seconds=self.interval)
+                if day_start(since) < day_start(now):
+                    days.add(day_start(since))
+                days.update(await self._changed_days(since))
+            written = await self.rebuild_days(days)
+            self.last_refresh = now
+            return written
+
+    async def _missing_days(self) -> List[datetime]:
+        """
+        Days from the first dated order/event up to today that have no daily_stats document
+        """
+        firsts = []
+        for collection in (self.db.orders, self.db.site_analytics):
+            doc = await collection.find_one({"created_at": {"$type": "date"}}, {"created_at": 1}, sort=[("created_at", 1)])
+            if doc:
+                firsts.append(doc["created_at"])
+        if not firsts:
+            return []
+        start = min(day_start(first) for first in firsts)
+        today = day_start(datetime.now(timezone.utc))
+        in_range = {"_id": {"$gte": start, "$lte": today}}
+        # Cheap check first: a complete range is one count over the _id index
+        if await self.db.daily_stats.count_documents(in_range) > (today - start).days:
+            return []
+        existing = {day_start(doc["_id"]) for doc in await self.db.daily_stats.find(in_range, {"_id": 1}).to_list(None)}
+        missing = []
+        current = start
+        while current <= today:
+            if current not in existing:
+                missing.append(current)
+            current += timedelta(days=1)
+        return missing
+
+    async def backfill(self) -> int:
+        """
+        Build every day in the order/event date range that has no daily_stats document yet.
+        Runs on every pass, so an interrupted backfill resumes where it stopped.
+        """
+        missing = await self._missing_days()
+        written = 0
+        i = 0
+        while i < len(missing):
+            # Rebuild contiguous runs; a month per pass keeps each $facet result well under the 16MB limit
+            start = end = missing[i]
+            while i < len(missing) and missing[i] == end and (end - start).days < BACKFILL_CHUNK_DAYS:
+                end += timedelta(days=1)
+                i += 1
+            written += await self.rebuild(start, end)
+        return written
+
+    async def _refresh_loop(self, after: Optional[asyncio.Future]):
+        if after is not None:
+            # Days built before legacy string dates are converted would come out empty
+            await asyncio.wait({after})
+        while True:
+            try:
+                await self.backfill()
+            except Exception as e:
+                print(f"Daily stats backfill failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+                # Let a burst of writes settle into one rebuild
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Daily stats refresh failed: {e}")
+
+    async def read(self, from_dt: datetime, to_dt: datetime) -> List[Dict[str, Any]]:
+        """
+        Day documents covering [from_dt, to_dt], oldest first; partial days count as whole days
+        """
+        return await self.db.daily_stats.find(
+            {"_id": {"$gte": day_start(from_dt), "$lte": day_start(to_dt)}}
+        ).sort("_id", 1).to_list(None)
+
+    @staticmethod
+    def summarize(days: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge day documents into range totals
+        """
+        statuses: Dict[Any, int] = {}
+        payments: Dict[Any, Dict[str, float]] = {}
+        categories: Dict[Any, Dict[str, float]] = {}
+        events = {event_type: 0 for event_type in EVENT_TYPES}
+        pages: Dict[Any, int] = {}
+        products: Dict[Any, int] = {}
+        for day in days:
+            for row in day.get("statuses", []):
+                statuses[row["status"]] = statuses.get(row["status"], 0) + row["count"]
+            for row in day.get("payments", []):
+                merged = payments.setdefault(row["method"], {"count": 0, "revenue": 0})
+                merged["count"] += row["count"]
+                merged["revenue"] += row["revenue"]
+            for row in day.get("categories", []):
+                merged = categories.setdefault(row["name"], {"revenue": 0, "items": 0})
+                merged["revenue"] += row["revenue"]
+                merged["items"] += row["items"]
+            for event_type, count in (day.get("events") or {}).items():
+                events[event_type] = events.get(event_type, 0) + count
+            for row in day.get("pages", []):
+                pages[row["page"]] = pages.get(row["page"], 0) + row["visits"]
+            for row in day.get("products", []):
+                products[row["product_id"]] = products.get(row["product_id"], 0) + row["visits"]
+        return {
+            "orders": sum(day.get("orders", 0) for day in days),
+            "cancelled": sum(day.get("cancelled", 0) for day in days),
+            "revenue": sum(day.get("revenue", 0) for day in days),
+            "statuses": statuses,
+            "payments": payments,
+            "categories": categories,
+            "events": events,
+            "pages": pages,
+            "products": products,
+        }
+
+    def start(self, db, after: Optional[asyncio.Future] = None):
+        """
+        Start the refresh loop; with `after` (e.g. the date migration task) it waits for that to finish first
+        """
+        self.db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(after))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "dirty_days": len(self._dirty),
+            "days_rebuilt": self.days_rebuilt,
+            "last_refresh": self.last_refresh,
+        }
@@ -0,0 +1,100 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache import CatalogCache
+
+PoolLoader = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+
+class ProductRotation:
+    """
+    Homepage rotations (featured, new arrivals) materialized once per time window.
+
+    Each window's selection is drawn from the listing pool with a private RNG seeded
+    by the rotation name and window number, so every worker picks the same products
+    without touching the global `random` state. A selection is reused until the
+    window ends or the catalog generation changes (any product write), and a
+    background task pre-builds the next window at each boundary.
+    """
+
+    def __init__(self, catalog_cache: CatalogCache, window: float = 600.0, size: int = 8):
+        self.catalog_cache = catalog_cache
+        # A zero/negative window would divide by zero on every request; rotate at most once a second
+        self.window = max(window, 1.0)
+        self.size = size
+        self._loaders: Dict[str, PoolLoader] = {}
+        self._selections: Dict[str, Tuple[int, int, List[Dict[str, Any]]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.materialized = 0
+
+    def register(self, name: str, loader: PoolLoader) -> None:
+        self._loaders[name] = loader
+        self._locks[name] = asyncio.Lock()
+
+    def current_window(self) -> int:
+        return int(time.time() // self.window)
+
+    def _fresh(self, name: str, window: int) -> Optional[List[Dict[str, Any]]]:
+        selection = self._selections.get(name)
+        if selection and selection[0] == window and selection[1] == self.catalog_cache.generation:
+            return selection[2]
+        return None
+
+    async def _materialize(self, name: str, window: int) -> List[Dict[str, Any]]:
+        async with self._locks[name]:
+            selection = self._fresh(name, window)
+            if selection is not None:
+                return selection
+            generation = self.catalog_cache.generation
+            pool = await self._loaders[name]()
+            rng = random.Random(f"{name}:{window}")
+            selection = rng.sample(pool, min(self.size, len(pool)))
+            self._selections[name] = (window, generation, selection)
+            self.materialized += 1
+            return selection
+
+    async def get(self, name: str) -> List[Dict[str, Any]]:
+        window = self.current_window()
+        selection = self._fresh(name, window)
+        if selection is None:
+            selection = await self._materialize(name, window)
+        return [dict(product) for product in selection]
+
+    def invalidate(self) -> None:
+        self._selections.clear()
+
+    async def _refresh_loop(self):
+        while True:
+            window = self.current_window()
+            for name in list(self._loaders):
+                try:
+                    await self._materialize(name, window)
+                except Exception as e:
+                    print(f"Failed to materialize {name} rotation: {e}")
+            # Wake just after the next window boundary
+            await asyncio.sleep((window + 1) * self.window - time.time() + 0.5)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "size": self.size,
+            "current_window": self.current_window(),
+            "materialized": self.materialized,
+            "selections": {name: len(selection[2]) for name, selection in self._selections.items()},
+        }
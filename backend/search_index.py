@@ -0,0 +1,395 @@
+import asyncio
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Field weights for relevance: a hit in the title counts for more than one in the description
+FIELD_WEIGHTS: Dict[str, float] = {
+    "title": 3.0,
+    "brand": 2.5,
+    "tags": 2.0,
+    "category": 1.5,
+    "subcategory": 1.5,
+    "colors": 1.0,
+    "description": 1.0,
+}
+
+# Spelling variants and synonyms shoppers use for the same garment, mapped to one canonical term
+SYNONYMS: Dict[str, str] = {
+    "sari": "saree", "sarees": "saree", "saris": "saree",
+    "kurtis": "kurti", "kurtas": "kurta",
+    "lehnga": "lehenga", "lengha": "lehenga", "lehanga": "lehenga", "lehengas": "lehenga", "ghagra": "lehenga", "chaniya": "lehenga",
+    "shalwar": "salwar", "salvar": "salwar",
+    "kameez": "kameez", "kamiz": "kameez", "qameez": "kameez",
+    "chunni": "dupatta", "chunri": "dupatta", "chunari": "dupatta", "odhni": "dupatta", "dupattas": "dupatta",
+    "churidaar": "churidar", "chudidar": "churidar",
+    "pyjama": "pajama", "pajamas": "pajama", "pyjamas": "pajama",
+    "dhoti": "dhoti", "veshti": "dhoti", "mundu": "dhoti",
+    "tshirt": "tshirt", "tshirts": "tshirt", "tee": "tshirt", "tees": "tshirt",
+    "jean": "jeans", "denims": "denim",
+    "gents": "men", "mens": "men", "male": "men", "man": "men",
+    "ladies": "women", "womens": "women", "female": "women", "woman": "women",
+    "kid": "kids", "children": "kids", "child": "kids", "childrens": "kids",
+    "boy": "boys", "girl": "girls",
+    "traditional": "ethnic", "desi": "ethnic",
+}
+
+CANONICAL_TERMS = set(SYNONYMS.values())
+
+STOPWORDS = {"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with"}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_term(term: str) -> str:
+    term = SYNONYMS.get(term, term)
+    # Light plural folding for words without an explicit mapping ("dresses" -> "dress", "tops" -> "top")
+    if term not in CANONICAL_TERMS and len(term) > 3:
+        if term.endswith("es") and term[:-2].endswith(("ss", "sh", "ch", "x")):
+            term = term[:-2]
+        elif term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+    return term
+
+
+def split_words(text: Any) -> List[str]:
+    """
+    Lowercase, strip accents, drop apostrophes ("men's" -> "mens") and hyphens
+    ("t-shirt" -> "tshirt"), and split into words without stopwords
+    """
+    if text is None:
+        return []
+    if isinstance(text, (list, tuple, set)):
+        text = " ".join(str(part) for part in text)
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"(?<=\w)['’-](?=\w)", "", text)
+    return [word for word in _TOKEN_RE.findall(text) if word not in STOPWORDS]
+
+
+def tokenize(text: Any) -> List[str]:
+    return [normalize_term(word) for word in split_words(text)]
+
+
+class SuggestionIndex:
+    """
+    Autocomplete phrases (product titles, brands, categories, tags) in a sorted array.
+
+    Every phrase is stored under each of its word suffixes ("pink cotton kurti",
+    "cotton kurti", "kurti"), so typing any word of it finds it by bisection.
+    Brands, categories and tags are shared across products and ranked by how many
+    products carry them; they disappear once the last such product is removed.
+    """
+
+    # Lower ranks are suggested first
+    TYPE_RANK = {"category": 0, "brand": 1, "tag": 2, "product": 3}
+
+    def __init__(self, scan_limit: int = 200):
+        self.scan_limit = scan_limit
+        self._keys: List[Tuple[str, Tuple[str, str]]] = []
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._product_entries: Dict[str, List[Tuple[str, str]]] = {}
+
+    @staticmethod
+    def _phrase_keys(text: str) -> List[str]:
+        words = split_words(text)
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _add(self, entry_key: Tuple[str, str], text: str, product_id: str) -> None:
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            entry = {"text": text, "type": entry_key[0], "products": set()}
+            if entry_key[0] == "product":
+                entry["id"] = product_id
+            self._entries[entry_key] = entry
+            for key in self._phrase_keys(text):
+                insort(self._keys, (key, entry_key))
+        entry["products"].add(product_id)
+        self._product_entries.setdefault(product_id, []).append(entry_key)
+
+    def _drop(self, entry_key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(entry_key)
+        for key in self._phrase_keys(entry["text"]):
+            position = bisect_left(self._keys, (key, entry_key))
+            if position < len(self._keys) and self._keys[position] == (key, entry_key):
+                del self._keys[position]
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        product_id = product.get("id")
+        if not product_id:
+            return
+        self.remove(product_id)
+        phrases = [("product", product_id, product.get("title"))]
+        for field, kind in (("brand", "brand"), ("category", "category"), ("subcategory", "category")):
+            phrases.append((kind, None, product.get(field)))
+        phrases.extend(("tag", None, tag) for tag in product.get("tags") or [])
+        for kind, key, text in phrases:
+            if not isinstance(text, str) or not split_words(text):
+                continue
+            text = text.strip()
+            entry_key = (kind, key or " ".join(split_words(text)))
+            if entry_key in self._product_entries.get(product_id, []):
+                continue
+            self._add(entry_key, text, product_id)
+
+    def remove(self, product_id: str) -> None:
+        for entry_key in self._product_entries.pop(product_id, []):
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                continue
+            entry["products"].discard(product_id)
+            if not entry["products"]:
+                self._drop(entry_key)
+
+    def build(self, products: Iterable[Dict[str, Any]]) -> None:
+        self._keys = []
+        self._entries = {}
+        self._product_entries = {}
+        for product in products:
+            self.upsert(product)
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        prefix = " ".join(split_words(query))
+        if not prefix:
+            return []
+        matched: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        start = bisect_left(self._keys, (prefix,))
+        for key, entry_key in self._keys[start:start + self.scan_limit]:
+            if not key.startswith(prefix):
+                break
+            matched.setdefault(entry_key, self._entries[entry_key])
+        ranked = sorted(
+            matched.values(),
+            key=lambda entry: (self.TYPE_RANK[entry["type"]], -len(entry["products"]), len(entry["text"]), entry["text"]),
+        )
+        suggestions = []
+        seen: Set[Tuple[str, str]] = set()
+        for entry in ranked:
+            # Identically titled products (e.g. colour variants) collapse into one suggestion
+            label = (entry["type"], entry["text"].lower())
+            if label in seen:
+                continue
+            seen.add(label)
+            suggestion = {"text": entry["text"], "type": entry["type"]}
+            if entry["type"] == "product":
+                suggestion["id"] = entry["id"]
+            else:
+                suggestion["count"] = len(entry["products"])
+            suggestions.append(suggestion)
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SearchIndex:
+    """
+    In-process inverted index over the product catalog.
+
+    Postings hold a field-weighted term frequency per product; queries score with
+    TF-IDF, require every query term to match, and treat the last term as a prefix
+    so partially typed words already find results. The sorted vocabulary answers
+    prefix lookups by bisection. Product writes update the index (and its
+    autocomplete suggestions) incrementally; a periodic rebuild picks up writes
+    handled by other workers.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, max_prefix_expansions: int = 50):
+        self.refresh_interval = refresh_interval
+        self.max_prefix_expansions = max_prefix_expansions
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self.suggestions = SuggestionIndex()
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+        # Bumped on every incremental write; rebuilds replay writes that raced them
+        self.generation = 0
+        self._pending: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+        self.searches = 0
+        self.rebuilds = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    @staticmethod
+    def _weighted_terms(product: Dict[str, Any]) -> Dict[str, float]:
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(product.get(field)):
+                weights[term] += weight
+        return weights
+
+    def _vocab(self) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(term for term, postings in self._postings.items() if postings)
+            self._vocabulary_dirty = False
+        return self._vocabulary
+
+    @classmethod
+    def _index_products(cls, products: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, float]], Dict[str, Set[str]], SuggestionIndex]:
+        postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        doc_terms: Dict[str, Set[str]] = {}
+        for product in products:
+            product_id = product.get("id")
+            if not product_id:
+                continue
+            weights = cls._weighted_terms(product)
+            for term, weight in weights.items():
+                postings[term][product_id] = weight
+            doc_terms[product_id] = set(weights)
+        suggestions = SuggestionIndex()
+        suggestions.build(products)
+        return postings, doc_terms, suggestions
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        product_id = product.get("id")
+        if not product_id:
+            return
+        self.remove(product_id)
+        if self._pending is not None:
+            self._pending[product_id] = product
+        weights = self._weighted_terms(product)
+        for term, weight in weights.items():
+            self._postings[term][product_id] = weight
+        self._doc_terms[product_id] = set(weights)
+        self._vocabulary_dirty = True
+        self.suggestions.upsert(product)
+
+    def remove(self, product_id: str) -> None:
+        self.generation += 1
+        if self._pending is not None:
+            self._pending[product_id] = None
+        self.suggestions.remove(product_id)
+        for term in self._doc_terms.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._vocabulary_dirty = True
+
+    def _swap(self, postings: Dict[str, Dict[str, float]], doc_terms: Dict[str, Set[str]], suggestions: SuggestionIndex) -> None:
+        self._postings = postings
+        self._doc_terms = doc_terms
+        self.suggestions = suggestions
+        self._vocabulary = sorted(postings)
+        self._vocabulary_dirty = False
+        self.ready = True
+        self.rebuilds += 1
+
+    def build(self, products: Iterable[Dict[str, Any]]) -> None:
+        self._swap(*self._index_products(list(products)))
+
+    def prefix_terms(self, prefix: str) -> List[str]:
+        vocabulary = self._vocab()
+        start = bisect_left(vocabulary, prefix)
+        terms = []
+        for term in vocabulary[start:start + self.max_prefix_expansions]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """
+        Product ids matching every query term, best match first
+        """
+        self.searches += 1
+        words = split_words(query)
+        if not words:
+            return []
+        terms = [normalize_term(word) for word in words]
+        total_docs = max(len(self._doc_terms), 1)
+        # Each query term expands to (factor, postings, idf) candidates; the word being typed
+        # also matches as a prefix of longer terms, at a discount
+        expanded = []
+        for i, term in enumerate(terms):
+            candidates = {term: 1.0}
+            if i == len(terms) - 1:
+                for expansion in self.prefix_terms(words[-1]):
+                    candidates.setdefault(expansion, 0.6)
+            matches = []
+            for candidate, factor in candidates.items():
+                postings = self._postings.get(candidate)
+                if postings:
+                    matches.append((factor * math.log(1 + total_docs / len(postings)), postings))
+            if not matches:
+                return []
+            expanded.append(matches)
+
+        # Start from the rarest term so later terms only score surviving candidates
+        expanded.sort(key=lambda matches: sum(len(postings) for _, postings in matches))
+        scores: Dict[str, float] = {}
+        for boost, postings in expanded[0]:
+            for product_id, weight in postings.items():
+                scores[product_id] = max(scores.get(product_id, 0.0), boost * weight)
+        for matches in expanded[1:]:
+            narrowed: Dict[str, float] = {}
+            for product_id, score in scores.items():
+                best = max((boost * postings[product_id] for boost, postings in matches if product_id in postings), default=None)
+                if best is not None:
+                    narrowed[product_id] = score + best
+            scores = narrowed
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    async def rebuild(self, db) -> None:
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in FIELD_WEIGHTS}}
+        # Writes from this worker while the snapshot is read and tokenized are recorded,
+        # then re-applied on top of it so the swap can't drop them
+        self._pending = {}
+        try:
+            products = await db.products.find({}, projection).to_list(None)
+            # Tokenizing the whole catalog is CPU work; do it off the event loop, then swap it in
+            index = await asyncio.to_thread(self._index_products, products)
+            pending = self._pending
+        finally:
+            self._pending = None
+        self._swap(*index)
+        for product_id, product in pending.items():
+            if product is None:
+                self.remove(product_id)
+            else:
+                self.upsert(product)
+
+    async def _refresh_loop(self, db):
+        while True:
+            try:
+                await self.rebuild(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Search index rebuild failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self, db):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "products": len(self._doc_terms),
+            "terms": len(self._postings),
+            "suggestions": len(self.suggestions),
+            "searches": self.searches,
+            "rebuilds": self.rebuilds,
+            "generation": self.generation,
+            "refresh_interval": self.refresh_interval,
+        }
@@ -5,20 +5,33 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from bson import ObjectId
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import uuid
+import re
 from datetime import datetime, timezone, timedelta
 import json
-import bcrypt
 from jose import jwt as jose_jwt
 from jose.exceptions import ExpiredSignatureError, JWTError
 import razorpay
-from delhivery import DelhiveryClient
+from delhivery import DelhiveryClient, AsyncDelhiveryClient
+from cache import CatalogCache, ResponseCache, TTLCache
+from password_service import PasswordService
+from invoices import InvoiceRenderer
+from images import DerivativeCache, ImagePipeline, IMMUTABLE_CACHE_CONTROL, OUTPUT_FORMATS, etag_matches, image_etag, negotiate_format
+from upload_store import UploadStore
+from tracking import TrackingService
+from search_index import SearchIndex
+from rotation import ProductRotation
+from rollups import DailyRollups
+from event_buffer import EventBuffer
+import migrate_dates
+from pagination import InvalidCursor, apply_cursor, cursor_from, decode_cursor, encode_cursor, with_tiebreaker
 import hmac
 import hashlib
 import requests
@@ -27,26 +40,20 @@ import smtplib
 import socket
 import ssl
 import time
-import random
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import qrcode
-try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4, A6, landscape, portrait
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as PlatypusImage, KeepInFrame, Flowable
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch, mm, cm
-    from reportlab.graphics.barcode import code128
-    from reportlab.graphics.shapes import Drawing 
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
-    REPORTLAB_AVAILABLE = True
-except Exception:
-    REPORTLAB_AVAILABLE = False
 import io
 from urllib.parse import unquote
-from PIL import Image, ImageOps
-from fastapi.responses import FileResponse, Response
+from PIL import Image
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+try:
+    import orjson  # noqa: F401
+except ImportError:
+    orjson = None
+
+# orjson when installed, the stdlib encoder otherwise
+APIResponse = ORJSONResponse if orjson else JSONResponse
 
 ROOT_DIR = Path(__file__).parent
 # Handle .env file loading with error handling
@@ -104,11 +111,11 @@ MAIL_FROM = os.environ.get("MAIL_FROM", SMTP_USER)
 
 try:
     if DELHIVERY_API_KEY:
-        delhivery_client = DelhiveryClient(
+        delhivery_client = AsyncDelhiveryClient(DelhiveryClient(
             api_key=DELHIVERY_API_KEY,
             client_name=DELHIVERY_CLIENT,
             warehouse_name=DELHIVERY_WAREHOUSE
-        )
+        ))
     else:
         print("Warning: Delhivery API key not provided")
         delhivery_client = None
@@ -116,6 +123,60 @@ except Exception as e:
     print(f"Warning: Failed to initialize Delhivery client: {e}")
     delhivery_client = None
 
+# Shipment tracking: a background poller stores in-transit scans on orders; the per-waybill
+# cache only covers live lookups for orders whose stored scan is stale or missing
+TRACKING_CACHE_TTL = float(os.environ.get("TRACKING_CACHE_TTL", "300"))
+TRACKING_POLL_INTERVAL = float(os.environ.get("TRACKING_POLL_INTERVAL", "900"))
+tracking_service = TrackingService(
+    delhivery_client, ttl=TRACKING_CACHE_TTL, poll_interval=TRACKING_POLL_INTERVAL
+) if delhivery_client else None
+
+# Catalog cache: product documents and featured/new-arrival pools served from memory
+CATALOG_CACHE_SIZE = int(os.environ.get("CATALOG_CACHE_SIZE", "2000"))
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "300"))
+catalog_cache = CatalogCache(max_products=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+# Encoded bodies of hot public endpoints (categories, CMS, featured products)
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "60"))
+response_cache = ResponseCache(max_size=256, ttl=RESPONSE_CACHE_TTL)
+
+# Featured / new-arrival selections rotate every PRODUCT_ROTATION_WINDOW seconds
+PRODUCT_ROTATION_WINDOW = float(os.environ.get("PRODUCT_ROTATION_WINDOW", "600"))
+product_rotation = ProductRotation(catalog_cache, window=PRODUCT_ROTATION_WINDOW, size=8)
+
+# Convert legacy ISO-string dates to native BSON dates in the background on startup
+MIGRATE_DATES_ON_STARTUP = os.environ.get("MIGRATE_DATES_ON_STARTUP", "true").lower() == "true"
+date_migration_task: Optional[asyncio.Task] = None
+
+# Per-day analytics aggregates in daily_stats; today is rebuilt every ROLLUP_INTERVAL seconds,
+# earlier days when writes touch them
+ROLLUP_INTERVAL = float(os.environ.get("ROLLUP_INTERVAL", "60"))
+daily_rollups = DailyRollups(interval=ROLLUP_INTERVAL)
+
+def touch_event_days(events: List[Dict[str, Any]]) -> None:
+    for created_at in {event["created_at"] for event in events}:
+        daily_rollups.touch(created_at)
+
+# Storefront analytics events are buffered in memory and written in batches
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", "2"))
+ANALYTICS_BUFFER_MAX = int(os.environ.get("ANALYTICS_BUFFER_MAX", "20000"))
+analytics_buffer = EventBuffer(
+    batch_size=ANALYTICS_BATCH_SIZE,
+    flush_interval=ANALYTICS_FLUSH_INTERVAL,
+    max_size=ANALYTICS_BUFFER_MAX,
+    on_flush=touch_event_days,
+)
+
+# Product search: in-process inverted index, updated on product writes and rebuilt periodically
+SEARCH_INDEX_REFRESH = float(os.environ.get("SEARCH_INDEX_REFRESH", "300"))
+search_index = SearchIndex(refresh_interval=SEARCH_INDEX_REFRESH)
+
+# bcrypt runs on its own thread pool so logins don't stall the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "0")) or None
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", "0")) or None
+password_service = PasswordService(max_workers=PASSWORD_HASH_WORKERS, max_concurrency=PASSWORD_HASH_CONCURRENCY)
+
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-super-secret-jwt-key-change-this-in-production')
 print(f"JWT Secret configured")
@@ -123,8 +184,14 @@ print(f"JWT Secret configured")
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRATION_DAYS = int(os.environ.get('JWT_EXPIRATION_DAYS', '7'))
 
+# Authenticated principals: decoded JWTs by token fingerprint and user/admin documents by id
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL, name="tokens")
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL, name="principals")
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=APIResponse)
 
 # CORS Configuration
 ALLOWED_ORIGINS = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:3000,http://localhost:3001,http://localhost:5173,https://mirvaa-fashions.vercel.app,https://www.mirvaafashions.com,https://mirvaafashions.com').split(',')
@@ -148,13 +215,30 @@ else:
     uploads_dir = (ROOT_DIR / "uploads").resolve()
 os.makedirs(uploads_dir, exist_ok=True)
 
+# Label/invoice PDFs render on a process pool instead of inside checkout
+INVOICE_RENDER_WORKERS = int(os.environ.get("INVOICE_RENDER_WORKERS", "0")) or None
+invoice_renderer = InvoiceRenderer(uploads_dir / "labels", max_workers=INVOICE_RENDER_WORKERS)
+
+# Uploads are streamed to disk and stored once per distinct content
+upload_store = UploadStore(uploads_dir)
+
+# Image variants are rendered at upload time, and on-demand resizes run on a separate bounded pool
+IMAGE_VARIANT_WORKERS = int(os.environ.get("IMAGE_VARIANT_WORKERS", "0")) or None
+IMAGE_TRANSFORM_WORKERS = int(os.environ.get("IMAGE_TRANSFORM_WORKERS", "0")) or None
+image_pipeline = ImagePipeline(uploads_dir, max_workers=IMAGE_VARIANT_WORKERS, transform_workers=IMAGE_TRANSFORM_WORKERS)
+
+# On-demand derivatives in uploads/cache are kept under a byte budget, least recently used evicted first
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+IMAGE_CACHE_MAX_AGE_DAYS = float(os.environ.get("IMAGE_CACHE_MAX_AGE_DAYS", "30"))
+image_cache = DerivativeCache(uploads_dir / "cache", max_bytes=IMAGE_CACHE_MAX_BYTES, max_age=IMAGE_CACHE_MAX_AGE_DAYS * 86400)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=FINAL_ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["Content-Type", "Authorization", "X-RTB-FINGERPRINT-ID", "x-rtb-fingerprint-id"],
+    expose_headers=["Content-Type", "Authorization", "X-RTB-FINGERPRINT-ID", "x-rtb-fingerprint-id", "X-Next-Cursor", "X-Total-Count"],
 )
 
 app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
@@ -165,6 +249,11 @@ async def add_corp_header(request, call_next):
     try:
         if request.url.path.startswith("/uploads"):
             response.headers["Cross-Origin-Resource-Policy"] = "cross-origin"
+            # Uploads never change under a name; labels/invoices are re-rendered in place
+            if request.url.path.startswith("/uploads/labels/"):
+                response.headers["Cache-Control"] = "no-cache"
+            elif response.status_code in (200, 304):
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
     except Exception:
         pass
     return response
@@ -172,13 +261,111 @@ async def add_corp_header(request, call_next):
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
+
+# ==================== Database Indexes ====================
+# Every collection the API queries, with the indexes its hot paths rely on.
+# Applied on startup; create_index is a no-op when an identical index exists.
+DB_INDEXES: Dict[str, List[IndexModel]] = {
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING)], name="category_price"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING)], name="category_created_at"),
+        IndexModel([("is_featured", ASCENDING)], name="is_featured"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+        IndexModel([("stock", ASCENDING)], name="stock"),
+    ],
+    "cart": [
+        IndexModel(
+            [("user_id", ASCENDING), ("product_id", ASCENDING), ("size", ASCENDING), ("color", ASCENDING), ("age_group", ASCENDING)],
+            name="user_product_variant",
+        ),
+        IndexModel([("id", ASCENDING)], name="id"),
+    ],
+    "wishlist": [
+        IndexModel([("user_id", ASCENDING), ("product_id", ASCENDING)], name="user_product"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("delhivery_waybill", ASCENDING)], name="delhivery_waybill", sparse=True),
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+    ],
+    "returns": [
+        IndexModel([("order_id", ASCENDING), ("product_id", ASCENDING)], name="order_product"),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "notifications": [
+        IndexModel([("is_read", ASCENDING), ("created_at", DESCENDING)], name="is_read_created_at"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("id", ASCENDING)], name="id"),
+    ],
+    "site_analytics": [
+        IndexModel([("created_at", ASCENDING), ("event_type", ASCENDING)], name="created_at_event_type"),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+        IndexModel([("password_reset_token_hash", ASCENDING)], name="password_reset_token_hash", sparse=True),
+    ],
+    "admins": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "reviews": [
+        IndexModel([("product_id", ASCENDING)], name="product_id"),
+    ],
+    "cms_pages": [
+        IndexModel([("slug", ASCENDING)], name="slug"),
+    ],
+    "audit_logs": [
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "email_otps": [
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "email_verifications": [
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+}
+
+# Outcome of the last ensure_indexes() run, reported by /api/health
+index_status: Dict[str, Any] = {"applied": False, "created": [], "failed": {}}
+
+async def ensure_indexes():
+    """Create every index in DB_INDEXES, recording failures instead of aborting startup."""
+    created = []
+    failed = {}
+    for collection, models in DB_INDEXES.items():
+        for model in models:
+            name = f"{collection}.{model.document['name']}"
+            try:
+                await db[collection].create_indexes([model])
+                created.append(name)
+            except Exception as e:
+                # e.g. duplicate ids blocking a unique index, or an existing index with other options
+                logging.error(f"Failed to create index {name}: {e}")
+                failed[name] = str(e)
+    index_status.update({
+        "applied": True,
+        "created": created,
+        "failed": failed,
+        "applied_at": datetime.now(timezone.utc),
+    })
+    print(f"MongoDB indexes ensured: {len(created)} ok, {len(failed)} failed")
+
 # Health endpoint and startup check
 @app.on_event("startup")
 async def verify_db_connection_on_startup():
-    global client, db
+    global client, db, date_migration_task
+    image_cache.start()
     try:
         print("Initializing MongoDB client in startup event...")
-        client = AsyncIOMotorClient(mongo_url)
+        client = AsyncIOMotorClient(mongo_url, tz_aware=True)
         db = client[os.environ.get('DB_NAME', 'mirvaa_fashions')]
         
         # motor connects lazily; force a ping to verify credentials/network
@@ -186,17 +373,39 @@ async def verify_db_connection_on_startup():
         print("MongoDB connectivity check: OK")
     except Exception as e:
         print(f"MongoDB connectivity check failed: {e}")
+        return
+
+    await ensure_indexes()
+    if MIGRATE_DATES_ON_STARTUP:
+        date_migration_task = asyncio.create_task(run_date_migration())
+    search_index.start(db)
+    product_rotation.start()
+    daily_rollups.start(db, after=date_migration_task)
+    analytics_buffer.start(db)
+    if tracking_service:
+        tracking_service.start(db)
+
+
+async def run_date_migration():
+    summary = await migrate_dates.migrate(db)
+    for key, result in summary.items():
+        print(f"Migrated {key}: {result['converted']} converted, {result['skipped']} unparseable")
 
 
 @api_router.get("/health")
 async def health():
+    indexes = {
+        "applied": index_status["applied"],
+        "count": len(index_status["created"]),
+        "failed": index_status["failed"],
+    }
     try:
         if db is None:
-            return {"ok": False, "db": "uninitialized"}
+            return {"ok": False, "db": "uninitialized", "indexes": indexes}
         await db.command("ping")
-        return {"ok": True, "db": "connected"}
+        return {"ok": True, "db": "connected", "indexes": indexes}
     except Exception as e:
-        return {"ok": False, "db": "error", "error": str(e)}
+        return {"ok": False, "db": "error", "error": str(e), "indexes": indexes}
 
 @api_router.get("/")
 async def root():
@@ -277,6 +486,50 @@ class Product(BaseModel):
     is_meesho_seller: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ProductCard(BaseModel):
+    """The slice of a product a listing grid renders; served for view=card."""
+    id: str
+    title: Optional[str] = None
+    category: Optional[str] = None
+    subcategory: Optional[str] = None
+    brand: Optional[str] = None
+    price: Optional[float] = None
+    mrp: Optional[float] = None
+    discount_percent: Optional[int] = 0
+    images: List[str] = Field(default_factory=list)
+    sizes: List[str] = Field(default_factory=list)
+    colors: List[str] = Field(default_factory=list)
+    stock: int = 0
+    rating: float = 0.0
+    reviews_count: int = 0
+    is_featured: bool = False
+    returnable: bool = False
+    created_at: Optional[datetime] = None
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucketCount(BaseModel):
+    range: str
+    min: float
+    max: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    sizes: List[FacetCount] = Field(default_factory=list)
+    colors: List[FacetCount] = Field(default_factory=list)
+    age_groups: List[FacetCount] = Field(default_factory=list)
+    brands: List[FacetCount] = Field(default_factory=list)
+    categories: List[FacetCount] = Field(default_factory=list)
+    price: List[PriceBucketCount] = Field(default_factory=list)
+
+class ProductFacetPage(BaseModel):
+    products: List[Product]
+    total: int
+    facets: ProductFacets
+    next_cursor: Optional[str] = None
+
 class ProductCreate(BaseModel):
     title: str
     description: str
@@ -479,17 +732,6 @@ class Notification(BaseModel):
     is_read: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class SiteAnalyticsEvent(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: Optional[str] = None
-    session_id: Optional[str] = None
-    event_type: str
-    page: str
-    product_id: Optional[str] = None
-    metadata: Dict[str, Any] = Field(default_factory=dict)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
 class SiteAnalyticsEventCreate(BaseModel):
     event_type: str
     page: str
@@ -497,13 +739,10 @@ class SiteAnalyticsEventCreate(BaseModel):
     product_id: Optional[str] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
-# ==================== Helper Functions ====================
-
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+class SiteAnalyticsEventBatch(BaseModel):
+    events: List[SiteAnalyticsEventCreate] = Field(..., min_length=1, max_length=100)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+# ==================== Helper Functions ====================
 
 def ensure_product_images(product: Dict[str, Any]) -> Dict[str, Any]:
     if not product:
@@ -526,373 +765,193 @@ def ensure_product_images(product: Dict[str, Any]) -> Dict[str, Any]:
                     break
     return product
 
-def generate_order_label(order: Dict) -> tuple[Optional[str], Optional[str]]:
-    if not REPORTLAB_AVAILABLE:
-        print("ReportLab is not available. Cannot generate PDF.")
-        return None, "ReportLab library is not available"
+PRODUCT_CARD_FIELDS = list(ProductCard.model_fields)
+# Defaults the Product model would fill in, so slim views match the full one for older documents
+PRODUCT_FIELD_DEFAULTS = {
+    name: info for name, info in Product.model_fields.items() if not info.is_required() and name not in ("id", "created_at")
+}
 
-    try:
-        filename = f"label_{order['order_number']}.pdf"
-        filepath = uploads_dir / "labels" / filename
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        # A4 page size
-        doc = SimpleDocTemplate(
-            str(filepath), 
-            pagesize=A4,
-            leftMargin=0.5*inch,
-            rightMargin=0.5*inch,
-            topMargin=0.5*inch,
-            bottomMargin=0.5*inch
-        )
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Custom Styles
-        style_normal = styles["Normal"]
-        style_normal.fontName = "Helvetica"
-        style_normal.fontSize = 8
-        style_normal.leading = 10
-        
-        style_bold = ParagraphStyle(
-            'Bold',
-            parent=style_normal,
-            fontName="Helvetica-Bold",
-        )
-        
-        style_title = ParagraphStyle(
-            'TitleCustom',
-            parent=styles["Title"],
-            fontName="Helvetica-Bold",
-            fontSize=16,
-            alignment=TA_LEFT,
-            spaceAfter=5
-        )
+def resolve_product_fields(view: Optional[str], fields: Optional[str]) -> Optional[List[str]]:
+    """Fields to return for view=card / fields=a,b,c; None means the full Product."""
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip() in Product.model_fields]
+        return ["id"] + [field for field in dict.fromkeys(requested) if field != "id"]
+    if view == "card":
+        return PRODUCT_CARD_FIELDS
+    if view and view != "full":
+        raise HTTPException(status_code=400, detail="view must be 'card' or 'full'")
+    return None
+
+def product_projection(fields: Optional[List[str]]) -> Dict[str, Any]:
+    if not fields:
+        return {"_id": 0}
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    if "images" in fields:
+        # ensure_product_images falls back to the first color image
+        projection["color_images"] = 1
+    return projection
+
+def serialize_product_fields(product: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Plain-dict serializer for slim product views; skips Pydantic validation entirely."""
+    if "images" in fields:
+        ensure_product_images(product)
+    slim = {}
+    for field in fields:
+        if field not in product:
+            if field in PRODUCT_FIELD_DEFAULTS:
+                slim[field] = PRODUCT_FIELD_DEFAULTS[field].get_default(call_default_factory=True)
+            continue
+        value = product[field]
+        slim[field] = value.isoformat() if isinstance(value, datetime) else value
+    return slim
+
+PRODUCT_FIELDS = list(Product.model_fields)
+
+def trusted_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encode documents read from our own database as-is, skipping response_model re-validation."""
+    if orjson is None:
+        content = jsonable_encoder(content)
+    return APIResponse(content=content, headers=headers)
+
+async def cached_response(namespace: str, key: Any, build, tag: Any = None) -> Response:
+    """Serve an encoded body from response_cache, building and encoding it once per key/tag."""
+    async def render() -> bytes:
+        return trusted_response(await build()).body
+    body = await response_cache.get_or_render(namespace, key, render, tag)
+    return Response(content=body, media_type="application/json")
+
+def product_fields_response(products: List[Dict[str, Any]], fields: Optional[List[str]], headers: Optional[Dict[str, str]] = None) -> Response:
+    """Products limited to `fields` (all Product fields when None), without building Product models."""
+    fields = fields or PRODUCT_FIELDS
+    return trusted_response([serialize_product_fields(product, fields) for product in products], headers)
+
+def normalize_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(product.get('created_at'), str):
+        product['created_at'] = datetime.fromisoformat(product['created_at'])
+    return ensure_product_images(product)
+
+async def hydrate_products(product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Resolve product ids to normalized product documents, from the catalog cache or a single $in query."""
+    unique_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+    if not unique_ids:
+        return {}
+    found, missing = catalog_cache.get_products(unique_ids)
+    if missing:
+        generation = catalog_cache.generation
+        products = await db.products.find({"id": {"$in": missing}}, {"_id": 0}).to_list(len(missing))
+        products = [normalize_product(product) for product in products]
+        catalog_cache.set_products(products, generation)
+        found.update({product["id"]: product for product in products})
+    return found
+
+# Price ranges shared by the storefront filter sidebar and the admin price distribution
+PRICE_BUCKETS = [
+    ("Under ₹500", 0, 500),
+    ("₹500 - ₹1000", 500, 1000),
+    ("₹1000 - ₹2000", 1000, 2000),
+    ("₹2000 - ₹5000", 2000, 5000),
+    ("Above ₹5000", 5000, None),
+]
 
-        style_center = ParagraphStyle(
-            'Center',
-            parent=style_normal,
-            alignment=TA_CENTER
-        )
+# Facet name -> product field
+PRODUCT_FACET_FIELDS = {
+    "sizes": "sizes",
+    "colors": "colors",
+    "age_groups": "age_groups",
+    "brands": "brand",
+    "categories": "category",
+}
 
-        # Helper to create QR code image
-        def create_qr_code(data):
-            if not data:
-                return None
-            qr = qrcode.QRCode(box_size=10, border=1)
-            qr.add_data(data)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-            buf = io.BytesIO()
-            img.save(buf, format="PNG")
-            buf.seek(0)
-            return PlatypusImage(buf, width=1.0*inch, height=1.0*inch)
-
-        # Helper to create Barcode
-        def create_barcode(data):
-            if not data:
-                return None
-            barcode = code128.Code128(data, barHeight=0.5*inch, barWidth=1.2, humanReadable=True)
-            if isinstance(barcode, Flowable):
-                return barcode
-            else:
-                d = Drawing(150, 40)
-                d.add(barcode)
-                return d
-
-        # --- Data Extraction ---
-        shipping = order.get('shipping_address', {})
-        waybill = order.get('delhivery_waybill') or order.get('order_number')
-        # Format: City_Temp1_L (mock pattern from image)
-        city = shipping.get('city', 'City').split()[0] if shipping.get('city') else 'City'
-        dest_code = f"{city}_Temp1_L"
-        pincode = shipping.get('pincode', '000000')
-        return_code = f"{pincode},3733369"
-        
-        # --- Top Section: Shipping Label ---
-        
-        # Left Column: Customer Address
-        customer_address_html = f"""
-        <b>Customer Address</b><br/>
-        <b>{shipping.get('name', 'Customer Name')}</b><br/>
-        {shipping.get('address') or shipping.get('street') or shipping.get('line1') or ''}<br/>
-        {shipping.get('city', '')}, {shipping.get('state', '')}, {shipping.get('pincode', '')}<br/>
-        Phone: {shipping.get('phone', '')}
-        """
-        
-        # "If undelivered, return to"
-        return_address_html = """
-        <b>If undelivered, return to:</b><br/>
-        <b>Mirvaa Fashions</b><br/>
-        P NO 16, F NO 102, MARUTHI RESIDENCY,<br/>
-        GOUTHAM NAGAR KRISHNA NAGAR<br/>
-        COLONY, Hyderabad<br/>
-        Near Oxford school<br/>
-        Rangareddy, Telangana, 500074
-        """
-        
-        left_col_content = [
-            Paragraph(customer_address_html, style_normal),
-            Spacer(1, 10),
-            Paragraph(return_address_html, style_normal)
-        ]
+def price_bucket_stages() -> List[Dict[str, Any]]:
+    """A $bucket counting products per PRICE_BUCKETS range; missing, negative or non-numeric prices are left out."""
+    return [
+        {"$match": {"price": {"$type": "number", "$gte": 0}}},
+        {"$bucket": {
+            "groupBy": "$price",
+            "boundaries": [low for _, low, _ in PRICE_BUCKETS] + [float("inf")],
+            "output": {"count": {"$sum": 1}}
+        }}
+    ]
 
-        # Right Column: Delhivery Info
-        # COD Bar
-        cod_amount = order.get('total', 0)
-        # Assuming COD if payment_method is cod, else Prepaid
-        payment_method = order.get('payment_method', 'prepaid').lower()
-        if payment_method == 'cod':
-            cod_text = "COD: Check the payable amount on the app"
-            cod_bg = colors.black
-            cod_fg = colors.white
-        else:
-            cod_text = "PREPAID"
-            cod_bg = colors.white
-            cod_fg = colors.black
-
-        cod_style = ParagraphStyle(
-            'COD',
-            parent=style_normal,
-            textColor=cod_fg,
-            backColor=cod_bg,
-            alignment=TA_CENTER,
-            fontSize=10,
-            leading=14,
-            fontName="Helvetica-Bold"
-        )
-        
-        # QR Code
-        qr_img = create_qr_code(waybill)
-        
-        # Barcode
-        barcode_drawing = create_barcode(waybill)
-
-        right_col_content = [
-            Paragraph(cod_text, cod_style),
-            Spacer(1, 5),
-            Table([
-                [
-                    [
-                        Paragraph("<b>Delhivery</b>", style_title),
-                        Paragraph('<font backColor="black" color="white"> Pickup </font>', style_normal),
-                        Spacer(1, 5),
-                        Paragraph("Destination Code", style_normal),
-                        Paragraph(f"<b>{dest_code}</b>", style_bold),
-                        Paragraph(f"({shipping.get('state', '')})", style_normal),
-                        Spacer(1, 5),
-                        Paragraph("Return Code", style_normal),
-                        Paragraph(f"<b>{return_code}</b>", style_bold),
-                    ],
-                    qr_img
-                ]
-            ], colWidths=[2.0*inch, 1.2*inch], style=TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP')])),
-            Spacer(1, 5),
-            Paragraph(f"<b>{waybill}</b>", style_center),
-            barcode_drawing
-        ]
+def label_price_buckets(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    counts = {row["_id"]: row["count"] for row in rows}
+    return [{"range": label, "min": low, "max": high, "count": counts.get(low, 0)} for label, low, high in PRICE_BUCKETS]
 
-        # Main Label Table
-        label_table = Table(
-            [[left_col_content, right_col_content]],
-            colWidths=[3.5*inch, 3.8*inch],
-        )
-        label_table.setStyle(TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('INNERGRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('TOPPADDING', (0, 0), (-1, -1), 2),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-        ]))
-        elements.append(label_table)
-
-        # --- Product Details Strip ---
-        # SKU | Size | Qty | Color | Order No.
-        first_item = order['items'][0] if order['items'] else {}
-        prod_sku = first_item.get('sku', first_item.get('product_id', 'N/A')[:8])
-        prod_size = first_item.get('size', 'N/A')
-        prod_qty = str(sum(item.get('quantity', 1) for item in order['items']))
-        prod_color = first_item.get('color', 'N/A')
-        
-        prod_data = [
-            ["Product Details"],
-            ["SKU", "Size", "Qty", "Color", "Order No."],
-            [prod_sku, prod_size, prod_qty, prod_color, order['order_number']]
+async def product_facets(base_query: Dict[str, Any], filters: Dict[str, Any], items_pipeline: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Per-facet counts (plus the total, and optionally a page of items) in a single $facet aggregation.
+    Each facet ignores its own filter, so the sidebar still shows counts for the sibling options.
+    """
+    def match_except(field: Optional[str]) -> List[Dict[str, Any]]:
+        other = {key: value for key, value in filters.items() if key != field}
+        return [{"$match": other}] if other else []
+
+    facet: Dict[str, List[Dict[str, Any]]] = {}
+    for name, field in PRODUCT_FACET_FIELDS.items():
+        facet[name] = match_except(field) + [
+            {"$unwind": f"${field}"},
+            {"$match": {field: {"$nin": [None, ""]}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": 50}
         ]
-        
-        prod_table = Table(prod_data, colWidths=[1.5*inch, 0.8*inch, 0.8*inch, 1.0*inch, 3.2*inch])
-        prod_table.setStyle(TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black), # Under header
-            ('SPAN', (0, 0), (-1, 0)), # Span "Product Details"
-            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 2),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ]))
-        elements.append(prod_table)
-        elements.append(Spacer(1, 10))
-
-        # --- Tax Invoice Section ---
-        
-        # Invoice Header
-        inv_header_data = [[
-            Paragraph("<b>TAX INVOICE</b>", style_center),
-            Paragraph("Original For Recipient", ParagraphStyle('Right', parent=style_normal, alignment=TA_RIGHT))
-        ]]
-        inv_header_table = Table(inv_header_data, colWidths=[3.65*inch, 3.65*inch])
-        inv_header_table.setStyle(TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        elements.append(inv_header_table)
-
-        # Invoice Meta Data (Bill To / Ship To / Sold By / Dates)
-        bill_to_html = f"""
-        <b>BILL TO / SHIP TO</b><br/>
-        {shipping.get('name', '')}, {shipping.get('address', '')},<br/>
-        {shipping.get('city', '')}, {shipping.get('state', '')}, {shipping.get('pincode', '')}<br/>
-        Place of Supply: {shipping.get('state', '')}
-        """
-        
-        sold_by_html = """
-        <b>Sold By : MANIKANTI VINAY KUMAR</b><br/>
-        Mirvaa Fashions, P NO 16 F NO 102 MARUTHI RESIDENCY GOUTHAM NAGAR KRISHNA NAGAR COLONY , Rangareddy, Telangana, 500074<br/>
-        <b>GSTIN - 36BWFPM1923G1ZN</b>
-        """
-        
-        created_dt = datetime.fromisoformat(order['created_at'].replace('Z', '+00:00')) if isinstance(order.get('created_at'), str) else order.get('created_at', datetime.now())
-        order_date_str = created_dt.strftime("%d.%m.%Y")
-        invoice_no = order.get('order_number')[-8:] 
-        
-        right_sub_table = Table([
-            [Paragraph(sold_by_html, style_normal)],
-            [
-                 Table([
-                    ["Purchase Order No.", "Invoice No.", "Order Date", "Invoice Date"],
-                    [order['order_number'][:15], invoice_no, order_date_str, order_date_str]
-                ], colWidths=[1.4*inch, 0.8*inch, 0.7*inch, 0.7*inch], style=TableStyle([
-                    ('FONTSIZE', (0,0), (-1,-1), 6),
-                    ('FONTNAME', (0,1), (-1,1), 'Helvetica-Bold'),
-                    ('VALIGN', (0,0), (-1,-1), 'TOP'),
-                ]))
-            ]
-        ], colWidths=[3.65*inch])
-        right_sub_table.setStyle(TableStyle([
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING', (0,0), (-1,-1), 0),
-            ('RIGHTPADDING', (0,0), (-1,-1), 0),
-            ('TOPPADDING', (0,0), (-1,-1), 0),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 0),
-        ]))
-
-        meta_container = Table([
-            [Paragraph(bill_to_html, style_normal), right_sub_table]
-        ], colWidths=[3.65*inch, 3.65*inch])
-        
-        meta_container.setStyle(TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('INNERGRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
-        elements.append(meta_container)
-
-        # --- Items Table ---
-        items_header = ["Description", "HSN", "Qty", "Gross Amount", "Discount", "Taxable Value", "Taxes", "Total"]
-        items_data = [items_header]
-        
-        total_taxable = 0
-        total_taxes = 0
-        final_total = 0
-        
-        for item in order['items']:
-            qty = item.get('quantity', 1)
-            price = float(item.get('price', 0)) 
-            # Back calculate tax (5% GST assumed from image)
-            tax_rate = 0.05
-            base_price = price / (1 + tax_rate)
-            tax_amount = price - base_price
-            
-            gross = price * qty
-            discount = 0 
-            taxable = base_price * qty
-            total_tax_item = tax_amount * qty
-            item_total = gross - discount 
-            
-            total_taxable += taxable
-            total_taxes += total_tax_item
-            final_total += item_total
-
-            items_data.append([
-                Paragraph(item.get('product_title', 'Item'), style_normal),
-                "6205", 
-                str(qty),
-                f"Rs.{gross:.2f}",
-                f"Rs.{discount}",
-                f"Rs.{taxable:.2f}",
-                f"IGST @5.0%\nRs.{total_tax_item:.2f}",
-                f"Rs.{item_total:.2f}"
-            ])
-            
-        shipping_cost = float(order.get('shipping_cost', 0) or order.get('shipping', 0))
-        if shipping_cost > 0:
-             # Assuming shipping is inclusive of tax or exempt? 
-             # Usually shipping attracts 18% GST but for simplicity matching 5% or treating as exempt if not specified.
-             # User said: "product price is 499, shipping is 50, total 549".
-             # If we treat 50 as gross, we can back calculate or just add it.
-             # Let's treat it as a line item.
-             base_ship = shipping_cost / 1.05
-             tax_ship = shipping_cost - base_ship
-             items_data.append([
-                "Shipping Charges", "9965", "NA", 
-                f"Rs.{shipping_cost:.2f}", "Rs.0", 
-                f"Rs.{base_ship:.2f}", 
-                f"IGST @5.0%\nRs.{tax_ship:.2f}", 
-                f"Rs.{shipping_cost:.2f}"
-             ])
-             total_taxable += base_ship
-             total_taxes += tax_ship
-             final_total += shipping_cost
-
-        # Total Row
-        items_data.append([
-            "Total", "", "", "", "", "", f"Rs.{total_taxes:.2f}", f"Rs.{final_total:.2f}"
-        ])
-
-        items_table = Table(items_data, colWidths=[2.3*inch, 0.5*inch, 0.4*inch, 0.9*inch, 0.7*inch, 0.9*inch, 0.8*inch, 0.8*inch])
-        items_table.setStyle(TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('INNERGRID', (0, 0), (-1, -2), 0.5, colors.grey), # Grid for items
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black), # Header line
-            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black), # Total line top
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 7),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-             ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'), # Bold Total
-        ]))
-        elements.append(items_table)
-        
-        # Disclaimer
-        disclaimer = "Tax is not payable on reverse charge basis. This is a computer generated invoice and does not require signature. Other charges are charges that are applicable to your order and include charges for logistics fee (where applicable). Includes discounts for your city and/or for online payments (as applicable)"
-        elements.append(Table([[Paragraph(disclaimer, ParagraphStyle('Disc', parent=style_normal, fontSize=6))]], style=TableStyle([
-            ('BOX', (0,0), (-1,-1), 1, colors.black),
-            ('TOPPADDING', (0,0), (-1,-1), 2),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 2),
-        ])))
-
-        doc.build(elements)
-        return str(filepath), None
-    except Exception as e:
-        print(f"Error generating PDF label: {e}")
-        import traceback
-        traceback.print_exc()
-        return None, str(e)
+    facet["price"] = match_except("price") + price_bucket_stages()
+    facet["total"] = match_except(None) + [{"$count": "count"}]
+    if items_pipeline is not None:
+        facet["items"] = match_except(None) + items_pipeline
+
+    pipeline = ([{"$match": base_query}] if base_query else []) + [{"$facet": facet}]
+    result = (await db.products.aggregate(pipeline).to_list(1) or [{}])[0]
+    facets = {
+        name: [{"value": str(row["_id"]), "count": row["count"]} for row in result.get(name, [])]
+        for name in PRODUCT_FACET_FIELDS
+    }
+    facets["price"] = label_price_buckets(result.get("price", []))
+    total = result.get("total", [{}])[0].get("count", 0) if result.get("total") else 0
+    return {"facets": facets, "total": total, "items": result.get("items")}
+
+async def load_product_pool(name: str, query: Dict[str, Any], sort: Optional[List[tuple]] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Fetch a listing pool (featured, new arrivals) through the catalog cache."""
+    pool = catalog_cache.get_pool(name)
+    if pool is not None:
+        return pool
+    generation = catalog_cache.generation
+    cursor = db.products.find(query, {"_id": 0})
+    if sort:
+        cursor = cursor.sort(sort)
+    products = [normalize_product(product) for product in await cursor.limit(limit).to_list(limit)]
+    catalog_cache.set_pool(name, products, generation)
+    return products
+
+# Categories to include (pulling from all requested categories)
+# We include variations like "Men's Wear" just in case, but prioritize the user's list.
+NEW_ARRIVAL_CATEGORIES = ["Shirts", "Jeans", "Ladies Dresses", "Sarees", "Men's Wear"]
+
+# Rotations draw from a larger pool: featured products, and the most recent products in these categories
+product_rotation.register("featured", lambda: load_product_pool("featured", {"is_featured": True}))
+product_rotation.register("new_arrivals", lambda: load_product_pool(
+    "new_arrivals",
+    {"category": {"$in": NEW_ARRIVAL_CATEGORIES}},
+    sort=[("created_at", -1)]
+))
+
+async def attach_products(items: List[Dict[str, Any]], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Join cart/wishlist rows with their products (optionally slimmed to `fields`), skipping rows whose product no longer exists."""
+    products = await hydrate_products([item.get('product_id') for item in items])
+    if fields:
+        products = {product_id: serialize_product_fields(product, fields) for product_id, product in products.items()}
+    enriched_items = []
+    for item in items:
+        product = products.get(item.get('product_id'))
+        if not product:
+            continue
+        if isinstance(item.get('created_at'), str):
+            item['created_at'] = datetime.fromisoformat(item['created_at'])
+        enriched_items.append({
+            **item,
+            "product": product
+        })
+    return enriched_items
 
 async def create_notification(type: str, message: str, order_id: Optional[str] = None):
     try:
@@ -902,7 +961,6 @@ async def create_notification(type: str, message: str, order_id: Optional[str] =
             order_id=order_id
         )
         notif_dict = notification.model_dump()
-        notif_dict['created_at'] = notif_dict['created_at'].isoformat()
         if db is not None:
             await db.notifications.insert_one(notif_dict)
     except Exception as e:
@@ -919,27 +977,47 @@ def create_token(user_id: str, email: str) -> str:
     return jose_jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def verify_token(token: str) -> Dict:
+    fingerprint = hashlib.sha256(token.encode()).hexdigest()
+    cached = token_cache.get(fingerprint)
+    if cached is not None and cached.get('exp', 0) > time.time():
+        return dict(cached)
     try:
         payload = jose_jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Never memoize a token past its own expiry
+    ttl = min(AUTH_CACHE_TTL, payload.get('exp', 0) - time.time())
+    if ttl > 0:
+        token_cache.set(fingerprint, dict(payload), ttl=ttl)
+    return payload
+
+def invalidate_principal(kind: str, principal_id: str):
+    principal_cache.delete((kind, principal_id))
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
     payload = verify_token(credentials.credentials)
-    user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    key = ("user", payload['user_id'])
+    user = principal_cache.get(key)
+    if user is None:
+        user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal_cache.set(key, user)
+    # Handlers mutate the returned document (e.g. popping the password), so hand out a copy
+    return dict(user)
 
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
     payload = verify_token(credentials.credentials)
-    admin = await db.admins.find_one({"id": payload['user_id']}, {"_id": 0})
-    if not admin:
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return admin
+    key = ("admin", payload['user_id'])
+    admin = principal_cache.get(key)
+    if admin is None:
+        admin = await db.admins.find_one({"id": payload['user_id']}, {"_id": 0})
+        if not admin:
+            raise HTTPException(status_code=403, detail="Admin access required")
+        principal_cache.set(key, admin)
+    return dict(admin)
 
 # ==================== Auth Routes ====================
 
@@ -964,7 +1042,7 @@ async def register(user_data: UserRegister):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    hashed_pw = hash_password(user_data.password)
+    hashed_pw = await password_service.hash(user_data.password)
     user = User(
         email=user_data.email,
         name=user_data.name,
@@ -974,7 +1052,6 @@ async def register(user_data: UserRegister):
     
     user_dict = user.model_dump()
     user_dict['password'] = hashed_pw
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
     
     await db.users.insert_one(user_dict)
     await db.email_verifications.delete_one({"email": user_data.email})
@@ -1155,7 +1232,7 @@ async def forgot_password(req: ForgotPasswordRequest, background_tasks: Backgrou
     expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
     await db.users.update_one(
         {"id": user_doc["id"]},
-        {"$set": {"password_reset_token_hash": token_hash, "password_reset_expires_at": expires_at.isoformat()}}
+        {"$set": {"password_reset_token_hash": token_hash, "password_reset_expires_at": expires_at}}
     )
     background_tasks.add_task(_send_reset_email, req.email, raw_token)
     return {"message": "If the account exists, a reset email has been sent"}
@@ -1184,11 +1261,12 @@ async def reset_password(data: ResetPasswordConfirm):
     if datetime.now(timezone.utc) > expires_dt:
         raise HTTPException(status_code=400, detail="Token expired")
         
-    new_hash = hash_password(data.new_password)
+    new_hash = await password_service.hash(data.new_password)
     await db.users.update_one(
         {"id": user_doc["id"]},
         {"$set": {"password": new_hash}, "$unset": {"password_reset_token_hash": "", "password_reset_expires_at": ""}}
     )
+    invalidate_principal("user", user_doc["id"])
     return {"message": "Password updated"}
 
 DISPOSABLE_DOMAINS = {
@@ -1231,8 +1309,8 @@ async def send_otp(req: SendOtpRequest):
             "$set": {
                 "email": req.email, 
                 "code_hash": code_hash, 
-                "expires_at": expires_at.isoformat(),
-                "last_sent_at": datetime.now(timezone.utc).isoformat()
+                "expires_at": expires_at,
+                "last_sent_at": datetime.now(timezone.utc)
             }
         },
         upsert=True,
@@ -1317,13 +1395,17 @@ async def verify_otp(req: VerifyOtpRequest):
         {
             "$set": {
                 "email": req.email,
-                "verified_at": datetime.now(timezone.utc).isoformat(),
-                "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat(),
+                "verified_at": datetime.now(timezone.utc),
+                "expires_at": datetime.now(timezone.utc) + timedelta(minutes=30),
             }
         },
         upsert=True,
     )
-    await db.users.update_one({"email": req.email}, {"$set": {"email_verified": True}})
+    verified_user = await db.users.find_one_and_update(
+        {"email": req.email}, {"$set": {"email_verified": True}}, projection={"_id": 0, "id": 1}
+    )
+    if verified_user:
+        invalidate_principal("user", verified_user["id"])
     await db.email_otps.delete_one({"email": req.email})
     return {"status": "approved"}
 
@@ -1357,17 +1439,18 @@ async def update_user_profile(profile_data: UserProfileUpdate, current_user: Dic
         
         # Verify current password
         user_doc = await db.users.find_one({"id": current_user['id']})
-        if not verify_password(profile_data.currentPassword, user_doc['password']):
+        if not await password_service.verify(profile_data.currentPassword, user_doc['password']):
             raise HTTPException(status_code=400, detail="Current password is incorrect")
         
         # Hash new password
-        update_data['password'] = hash_password(profile_data.newPassword)
+        update_data['password'] = await password_service.hash(profile_data.newPassword)
     
     # Update user in database
     result = await db.users.update_one(
         {"id": current_user['id']},
         {"$set": update_data}
     )
+    invalidate_principal("user", current_user['id'])
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1385,6 +1468,7 @@ async def update_user_addresses(addresses: List[Dict[str, Any]] = Body(...), cur
         {"id": current_user['id']},
         {"$set": {"addresses": addresses}}
     )
+    invalidate_principal("user", current_user['id'])
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1401,7 +1485,7 @@ async def login(credentials: UserLogin):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(credentials.password, user_doc['password']):
+    if not await password_service.verify(credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Convert datetime
@@ -1437,9 +1521,9 @@ async def admin_login(credentials: AdminLogin):
             new_admin = {
                 "id": str(uuid.uuid4()),
                 "username": credentials.username,
-                "password": hash_password(credentials.password),
+                "password": await password_service.hash(credentials.password),
                 "role": "admin",
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             }
             await db.admins.insert_one(new_admin)
             token = create_token(new_admin['id'], credentials.username)
@@ -1447,7 +1531,7 @@ async def admin_login(credentials: AdminLogin):
         else:
             raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(credentials.password, admin_doc['password']):
+    if not await password_service.verify(credentials.password, admin_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_token(admin_doc['id'], credentials.username)
@@ -1481,7 +1565,15 @@ async def get_dashboard_stats(admin: Dict = Depends(get_current_admin)):
 
 # ==================== Product Routes ====================
 
-@api_router.get("/products", response_model=List[Product])
+async def page_by_relevance(ranked_ids: List[str], query: Dict[str, Any], skip: int, limit: int) -> List[Dict[str, Any]]:
+    """Apply the remaining filters to search hits, page them by score, then hydrate only that page."""
+    matching = await db.products.find(query, {"_id": 0, "id": 1}).to_list(len(ranked_ids))
+    matching_ids = {product['id'] for product in matching}
+    page_ids = [product_id for product_id in ranked_ids if product_id in matching_ids][skip:skip + limit]
+    hydrated = await hydrate_products(page_ids)
+    return [hydrated[product_id] for product_id in page_ids if product_id in hydrated]
+
+@api_router.get("/products", response_model=Union[List[Product], ProductFacetPage])
 async def get_products(
     category: Optional[str] = None,
     subcategory: Optional[str] = None,
@@ -1491,9 +1583,22 @@ async def get_products(
     max_price: Optional[float] = None,
     size: List[str] = Query(None),
     age_group: List[str] = Query(None),
-    limit: int = 50,
-    skip: int = 0
+    color: List[str] = Query(None),
+    brand: List[str] = Query(None),
+    facets: bool = False,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000),
+    skip: int = Query(0, ge=0)
 ):
+    """
+    List products; with facets=true, also return the total and per-facet counts for the filter sidebar.
+    Documents are encoded directly rather than re-validated as Product models; view=card (or fields=a,b,c)
+    returns slim product cards projected in MongoDB.
+    """
+    product_fields = resolve_product_fields(view, fields)
+    projection = product_projection(product_fields)
     query = {}
     
     if category:
@@ -1507,25 +1612,40 @@ async def get_products(
         query['category'] = formatted_category
     if subcategory:
         query['subcategory'] = subcategory
+    ranked_ids = None
     if search:
-        query['$or'] = [
-            {'title': {'$regex': search, '$options': 'i'}},
-            {'description': {'$regex': search, '$options': 'i'}},
-            {'tags': {'$regex': search, '$options': 'i'}}
-        ]
+        if search_index.ready:
+            ranked_ids = [product_id for product_id, _ in search_index.search(search)]
+            query['id'] = {'$in': ranked_ids}
+        else:
+            # Index still warming up: fall back to a literal (escaped) substring match
+            pattern = re.escape(search)
+            query['$or'] = [
+                {'title': {'$regex': pattern, '$options': 'i'}},
+                {'description': {'$regex': pattern, '$options': 'i'}},
+                {'tags': {'$regex': pattern, '$options': 'i'}}
+            ]
+    # Sidebar filters are kept apart from the base query so facets can exclude their own
+    filters = {}
     if min_price is not None or max_price is not None:
-        query['price'] = {}
+        filters['price'] = {}
         if min_price is not None:
-            query['price']['$gte'] = min_price
+            filters['price']['$gte'] = min_price
         if max_price is not None:
-            query['price']['$lte'] = max_price
+            filters['price']['$lte'] = max_price
     
     if size:
-        query['sizes'] = {'$in': size}
+        filters['sizes'] = {'$in': size}
         
     if age_group:
         # Match products that have at least one of the selected age groups
-        query['age_groups'] = {'$in': age_group}
+        filters['age_groups'] = {'$in': age_group}
+    
+    if color:
+        filters['colors'] = {'$in': color}
+    
+    if brand:
+        filters['brand'] = {'$in': brand}
 
     sort_option = None
     if sort == 'price_low':
@@ -1537,79 +1657,99 @@ async def get_products(
     elif sort == 'rating':
         sort_option = [('rating', -1)]
     
-    cursor = db.products.find(query, {"_id": 0})
+    relevance_order = ranked_ids is not None and not sort_option
     
+    # Keyset pagination: the cursor encodes the last row's sort key (or, for relevance-ranked
+    # search, an offset into the ranking); `skip` remains for callers that don't send one and is
+    # ignored when a cursor is given, since the cursor already marks the position
     if sort_option:
-        cursor = cursor.sort(sort_option)
-    
-    products = await cursor.skip(skip).limit(limit).to_list(limit)
-    
-    for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-        ensure_product_images(product)
+        sort_option = with_tiebreaker(sort_option)
+    else:
+        # No explicit sort: keep the natural (insertion) order, paging on _id
+        sort_option = [("_id", 1)]
+    if product_fields:
+        # The cursor is built from the sort key, so project it even if it wasn't asked for
+        projection.update({field: 1 for field, _ in sort_option})
+    elif sort_option[0][0] == "_id":
+        projection.pop("_id", None)
+    keyset = {}
+    if cursor:
+        skip = 0
+    try:
+        if cursor and relevance_order:
+            skip = int(decode_cursor(cursor).get("offset", 0))
+        elif cursor:
+            keyset = apply_cursor({}, sort_option, cursor)
+    except (InvalidCursor, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    def next_cursor(page: List[Dict[str, Any]]) -> Optional[str]:
+        if len(page) < limit:
+            return None
+        if relevance_order:
+            return encode_cursor({"offset": skip + limit})
+        return cursor_from(page[-1], sort_option)
+    
+    if facets:
+        # Counts, total and (unless ordering by relevance) the page itself in one round trip
+        items_pipeline = None
+        if not relevance_order:
+            items_pipeline = ([{"$match": keyset}] if keyset else []) + [
+                {"$sort": dict(sort_option)}, {"$skip": skip}, {"$limit": limit}
+            ] + ([{"$project": projection}] if projection else [])
+        faceted = await product_facets(query, filters, items_pipeline)
+        products = faceted["items"] if not relevance_order else await page_by_relevance(ranked_ids, {**query, **filters}, skip, limit)
+        products = products or []
+        next_page = next_cursor(products)
+        return trusted_response({
+            "products": [serialize_product_fields(product, product_fields or PRODUCT_FIELDS) for product in products],
+            "total": faceted["total"],
+            "facets": faceted["facets"],
+            "next_cursor": next_page
+        })
     
-    return products
+    query.update(filters)
+    if relevance_order:
+        products = await page_by_relevance(ranked_ids, query, skip, limit)
+    else:
+        if keyset:
+            query = {"$and": [query, keyset]} if query else keyset
+        products_cursor = db.products.find(query, projection or None).sort(sort_option)
+        products = await products_cursor.skip(skip).limit(limit).to_list(limit)
+    
+    next_page = next_cursor(products)
+    return product_fields_response(products, product_fields, {"X-Next-Cursor": next_page} if next_page else None)
+
+async def rotation_response(name: str, product_fields: Optional[List[str]]) -> Response:
+    async def build():
+        products = await product_rotation.get(name)
+        return [serialize_product_fields(product, product_fields or PRODUCT_FIELDS) for product in products]
+    # A new window or any product write changes the selection, so both are part of the tag
+    tag = (product_rotation.current_window(), catalog_cache.generation)
+    return await cached_response(name, tuple(product_fields or ()), build, tag)
 
 @api_router.get("/products/featured", response_model=List[Product])
-async def get_featured_products():
-    # Fetch a larger pool to allow for rotation
-    products = await db.products.find({"is_featured": True}, {"_id": 0}).limit(50).to_list(50)
-    
-    # Shuffle based on time (every 10 minutes)
-    if products:
-        seed = int(time.time() / 600)
-        random.seed(seed)
-        random.shuffle(products)
-    
-    # Return top 8
-    selected_products = products[:8]
-    
-    for product in selected_products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-        ensure_product_images(product)
-    
-    return selected_products
+async def get_featured_products(view: Optional[str] = None, fields: Optional[str] = None):
+    product_fields = resolve_product_fields(view, fields)
+    # This 10-minute window's 8 picks, materialized once and encoded once per view
+    return await rotation_response("featured", product_fields)
 
 @api_router.get("/products/new-arrivals", response_model=List[Product])
-async def get_new_arrivals():
-    # Categories to include (pulling from all requested categories)
-    # We include variations like "Men's Wear" just in case, but prioritize the user's list.
-    target_categories = ["Shirts", "Jeans", "Ladies Dresses", "Sarees", "Men's Wear"]
-    
-    # Fetch recent products from these categories (larger pool for rotation)
-    products = await db.products.find(
-        {"category": {"$in": target_categories}}, 
-        {"_id": 0}
-    ).sort("created_at", -1).limit(50).to_list(50)
-    
-    # Shuffle based on time (every 10 minutes)
-    if products:
-        seed = int(time.time() / 600)
-        random.seed(seed)
-        random.shuffle(products)
-    
-    # Return top 8
-    selected_products = products[:8]
-    
-    for product in selected_products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-        ensure_product_images(product)
-    
-    return selected_products
+async def get_new_arrivals(view: Optional[str] = None, fields: Optional[str] = None):
+    product_fields = resolve_product_fields(view, fields)
+    return await rotation_response("new_arrivals", product_fields)
+
+@api_router.get("/products/suggest")
+async def suggest_products(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(8, ge=1, le=20)):
+    """Search-as-you-type suggestions, served from memory without touching MongoDB"""
+    return {"query": q, "suggestions": search_index.suggestions.suggest(q, limit)}
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = (await hydrate_products([product_id])).get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
-    ensure_product_images(product)
-    
     return Product(**product)
 
 @api_router.post("/products", response_model=Product)
@@ -1630,9 +1770,10 @@ async def create_product(product_data: ProductCreate, admin: Dict = Depends(get_
         product.returnable = False
     
     product_dict = product.model_dump()
-    product_dict['created_at'] = product_dict['created_at'].isoformat()
     
     await db.products.insert_one(product_dict)
+    catalog_cache.invalidate_product(product.id)
+    search_index.upsert(product_dict)
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -1643,11 +1784,13 @@ async def update_product(product_id: str, product_data: ProductCreate, admin: Di
     
     update_data = product_data.model_dump()
     update_data['discount_percent'] = int(((update_data['mrp'] - update_data['price']) / update_data['mrp']) * 100) if update_data['mrp'] > 0 else 0
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    update_data['updated_at'] = datetime.now(timezone.utc)
     
     await db.products.update_one({"id": product_id}, {"$set": update_data})
+    catalog_cache.invalidate_product(product_id)
     
     updated_product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    search_index.upsert(updated_product)
     if isinstance(updated_product['created_at'], str):
         updated_product['created_at'] = datetime.fromisoformat(updated_product['created_at'])
     
@@ -1656,6 +1799,8 @@ async def update_product(product_id: str, product_data: ProductCreate, admin: Di
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, admin: Dict = Depends(get_current_admin)):
     result = await db.products.delete_one({"id": product_id})
+    catalog_cache.invalidate_product(product_id)
+    search_index.remove(product_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product deleted successfully"}
@@ -1668,25 +1813,11 @@ async def get_cart_count(current_user: Dict = Depends(get_current_user)):
     return {"count": count}
 
 @api_router.get("/cart")
-async def get_cart(current_user: Dict = Depends(get_current_user)):
+async def get_cart(view: Optional[str] = None, current_user: Dict = Depends(get_current_user)):
     cart_items = await db.cart.find({"user_id": current_user['id']}, {"_id": 0}).to_list(100)
     
-    # Populate product details
-    enriched_items = []
-    for item in cart_items:
-        product = await db.products.find_one({"id": item['product_id']}, {"_id": 0})
-        if product:
-            if isinstance(item['created_at'], str):
-                item['created_at'] = datetime.fromisoformat(item['created_at'])
-            if isinstance(product.get('created_at'), str):
-                product['created_at'] = datetime.fromisoformat(product['created_at'])
-            ensure_product_images(product)
-            enriched_items.append({
-                **item,
-                "product": product
-            })
-    
-    return enriched_items
+    # Populate product details in one round trip
+    return await attach_products(cart_items, resolve_product_fields(view, None))
 
 @api_router.post("/cart")
 async def add_to_cart(item_data: CartItemAdd, current_user: Dict = Depends(get_current_user)):
@@ -1719,7 +1850,6 @@ async def add_to_cart(item_data: CartItemAdd, current_user: Dict = Depends(get_c
         )
         
         cart_dict = cart_item.model_dump()
-        cart_dict['created_at'] = cart_dict['created_at'].isoformat()
         
         await db.cart.insert_one(cart_dict)
         return {"message": "Added to cart", "id": cart_item.id}
@@ -1758,25 +1888,11 @@ async def get_wishlist_count(current_user: Dict = Depends(get_current_user)):
     return {"count": count}
 
 @api_router.get("/wishlist")
-async def get_wishlist(current_user: Dict = Depends(get_current_user)):
+async def get_wishlist(view: Optional[str] = None, current_user: Dict = Depends(get_current_user)):
     wishlist_items = await db.wishlist.find({"user_id": current_user['id']}, {"_id": 0}).to_list(100)
     
-    # Populate product details
-    enriched_items = []
-    for item in wishlist_items:
-        product = await db.products.find_one({"id": item['product_id']}, {"_id": 0})
-        if product:
-            if isinstance(item['created_at'], str):
-                item['created_at'] = datetime.fromisoformat(item['created_at'])
-            if isinstance(product.get('created_at'), str):
-                product['created_at'] = datetime.fromisoformat(product['created_at'])
-            ensure_product_images(product)
-            enriched_items.append({
-                **item,
-                "product": product
-            })
-    
-    return enriched_items
+    # Populate product details in one round trip
+    return await attach_products(wishlist_items, resolve_product_fields(view, None))
 
 @api_router.post("/wishlist/{product_id}")
 async def add_to_wishlist(product_id: str, current_user: Dict = Depends(get_current_user)):
@@ -1795,7 +1911,6 @@ async def add_to_wishlist(product_id: str, current_user: Dict = Depends(get_curr
     )
     
     wishlist_dict = wishlist_item.model_dump()
-    wishlist_dict['created_at'] = wishlist_dict['created_at'].isoformat()
     
     await db.wishlist.insert_one(wishlist_dict)
     return {"message": "Added to wishlist", "id": wishlist_item.id}
@@ -1825,20 +1940,45 @@ async def track_shipping(order_id: str, current_user: Dict = Depends(get_current
         
         # Check if order has Delhivery waybill
         if "delhivery_waybill" in order and order["delhivery_waybill"]:
+            # Serve the scan the poller stored while it is fresh; only go to Delhivery when it is stale
+            if tracking_service:
+                scan = tracking_service.stored_scan(order)
+                if scan:
+                    return {
+                        "success": True,
+                        "tracking_data": {
+                            "latest_scan": scan,
+                            "synced_at": order.get("tracking_synced_at")
+                        },
+                        "courier": "Delhivery"
+                    }
+
             # Track with Delhivery
             try:
                 if delhivery_client:
-                    response = delhivery_client.track_shipment(order["delhivery_waybill"])
+                    response = await tracking_service.track(order["delhivery_waybill"])
                     return {"success": True, "tracking_data": response, "courier": "Delhivery"}
                 else:
                     # Fallback if client not initialized
                     tracking_url = f"https://track.delhivery.com/api/v1/packages/json/?waybill={order['delhivery_waybill']}&token={DELHIVERY_API_KEY}"
-                    response = requests.get(tracking_url)
+                    response = await asyncio.to_thread(requests.get, tracking_url, timeout=10)
                     if response.ok:
                         return {"success": True, "tracking_data": response.json(), "courier": "Delhivery"}
             except Exception as e:
                 print(f"Delhivery tracking error: {e}")
-            
+
+            # Delhivery unreachable: serve the last scan the poller stored on the order
+            if order.get("tracking_status"):
+                return {
+                    "success": True,
+                    "tracking_data": {
+                        "latest_scan": order["tracking_status"],
+                        "synced_at": order.get("tracking_synced_at")
+                    },
+                    "courier": "Delhivery",
+                    "stale": True
+                }
+
         # Fallback if no tracking info
         if "tracking_id" in order:
              return {
@@ -1912,7 +2052,7 @@ async def create_return_request(return_data: ReturnRequestCreate, current_user:
             {
                 "$set": {
                     "status": "return_requested",
-                    "updated_at": datetime.now(timezone.utc).isoformat()
+                    "updated_at": datetime.now(timezone.utc)
                 }
             }
         )
@@ -1931,7 +2071,6 @@ async def create_return_request(return_data: ReturnRequestCreate, current_user:
     )
     
     return_dict = return_request.model_dump()
-    return_dict['created_at'] = return_dict['created_at'].isoformat()
     
     await db.returns.insert_one(return_dict)
 
@@ -1940,7 +2079,7 @@ async def create_return_request(return_data: ReturnRequestCreate, current_user:
         {
             "$set": {
                 "status": "return_requested",
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }
         }
     )
@@ -2006,7 +2145,7 @@ async def update_return_status(return_id: str, status: str = Body(..., embed=Tru
                 {
                     "$set": {
                         "status": "returned",
-                        "updated_at": datetime.now(timezone.utc).isoformat()
+                        "updated_at": datetime.now(timezone.utc)
                     }
                 }
             )
@@ -2066,7 +2205,7 @@ async def approve_return_request(return_id: str, current_admin: Dict = Depends(g
 
     try:
         # Create Reverse Pickup in Delhivery
-        response = delhivery_client.create_return_shipment(
+        response = await delhivery_client.create_return_shipment(
             order=order,
             address=pickup_address,
             items=return_items
@@ -2088,7 +2227,7 @@ async def approve_return_request(return_id: str, current_admin: Dict = Depends(g
             {"$set": {
                 "status": "pickup_scheduled",
                 "waybill": waybill,
-                "pickup_scheduled_at": datetime.now(timezone.utc).isoformat()
+                "pickup_scheduled_at": datetime.now(timezone.utc)
             }}
         )
         
@@ -2097,7 +2236,7 @@ async def approve_return_request(return_id: str, current_admin: Dict = Depends(g
             {"id": return_req["order_id"]},
             {"$set": {
                 "status": "return_pickup_scheduled",
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }}
         )
         
@@ -2164,22 +2303,25 @@ async def create_order(
     )
     
     order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
-    order_dict['updated_at'] = order_dict['updated_at'].isoformat()
     
     result = await db.orders.insert_one(order_dict)
+    daily_rollups.touch(order.created_at)
     
-    # Generate invoice PDF for all orders
-    label_path = generate_order_label(order_dict)
-    if label_path:
+    # Render the invoice PDF in the background; invoice_url is filled in once it's ready
+    async def store_invoice(label_path: Optional[str], error: Optional[str]):
+        if not label_path:
+            print(f"Invoice generation failed for order {order_number}: {error}")
+            return
         update_fields: Dict[str, Any] = {"invoice_url": label_path}
         # Preserve existing behavior for COD orders by also setting label_url
         if order_data.payment_method == "cod":
             update_fields["label_url"] = label_path
         await db.orders.update_one(
-            {"_id": result.inserted_id},
+            {"id": order.id},
             {"$set": update_fields}
         )
+
+    invoice_renderer.enqueue(order_dict, on_done=store_invoice)
     
     if order_data.payment_method == "cod":
         await create_notification(
@@ -2240,7 +2382,7 @@ async def payment_success(
                 "razorpay_payment_id": razorpay_payment_id,
                 "razorpay_order_id": razorpay_order_id,
                 "status": "placed",
-                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "updated_at": datetime.now(timezone.utc),
             }
         }
     )
@@ -2414,6 +2556,7 @@ async def update_admin_profile(
         {"id": admin["id"]},
         {"$set": profile.dict()}
     )
+    invalidate_principal("admin", admin["id"])
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Admin not found")
@@ -2436,11 +2579,11 @@ async def change_admin_password(
     if not admin_data:
         raise HTTPException(status_code=404, detail="Admin not found")
     
-    if not verify_password(password_data.current_password, admin_data["password"]):
+    if not await password_service.verify(password_data.current_password, admin_data["password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Hash new password
-    hashed_password = hash_password(password_data.new_password)
+    hashed_password = await password_service.hash(password_data.new_password)
     
     # Create audit log
     await create_audit_log(
@@ -2455,6 +2598,7 @@ async def change_admin_password(
         {"id": admin["id"]},
         {"$set": {"password": hashed_password}}
     )
+    invalidate_principal("admin", admin["id"])
     
     return {"status": "success"}
 
@@ -2474,7 +2618,7 @@ async def change_admin_username(
     if not admin_data:
         raise HTTPException(status_code=404, detail="Admin not found")
     
-    if not verify_password(username_data.current_password, admin_data["password"]):
+    if not await password_service.verify(username_data.current_password, admin_data["password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Check if username already exists
@@ -2495,6 +2639,7 @@ async def change_admin_username(
         {"id": admin["id"]},
         {"$set": {"username": username_data.new_username}}
     )
+    invalidate_principal("admin", admin["id"])
     
     # Generate new token with updated username
     new_token = create_token(admin["id"], username_data.new_username)
@@ -2502,16 +2647,38 @@ async def change_admin_username(
     return {"status": "success", "token": new_token, "username": username_data.new_username}
 
 @api_router.get("/admin/orders")
-async def get_all_orders(admin: Dict = Depends(get_current_admin)):
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    for order in orders:
-        if isinstance(order['created_at'], str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order['updated_at'], str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
-    
-    return orders
+async def get_all_orders(
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    with_total: bool = False,
+    admin: Dict = Depends(get_current_admin)
+):
+    """Orders newest first; pass X-Next-Cursor back as `cursor` for the next page"""
+    filter_dict = {}
+    if status:
+        filter_dict["status"] = status
+    if user_id:
+        filter_dict["user_id"] = user_id
+    
+    sort_spec = [("created_at", -1), ("id", -1)]
+    try:
+        query = apply_cursor(filter_dict, sort_spec, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    orders = await db.orders.find(query, {"_id": 0}).sort(sort_spec).limit(limit).to_list(limit)
+    headers = {}
+    if len(orders) == limit:
+        headers["X-Next-Cursor"] = cursor_from(orders[-1], sort_spec)
+    if with_total:
+        # Unfiltered totals come from collection metadata; filtered ones need a count
+        total = await db.orders.count_documents(filter_dict) if filter_dict else await db.orders.estimated_document_count()
+        headers["X-Total-Count"] = str(total)
+    
+    # Up to 1000 documents straight from the collection: encode them without a per-row pass
+    return trusted_response(orders, headers)
 
 @api_router.put("/admin/orders/{order_id}/status")
 async def update_order_status(
@@ -2528,7 +2695,7 @@ async def update_order_status(
 
     updates: Dict[str, Any] = {
         "status": status,
-        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc),
     }
 
     if data.tracking_id is not None:
@@ -2546,6 +2713,8 @@ async def update_order_status(
             "$set": updates
         }
     )
+    if isinstance(order.get("created_at"), datetime):
+        daily_rollups.touch(order["created_at"])
 
     if status == "shipped" and order["status"] != "shipped":
         for item in order["items"]:
@@ -2566,6 +2735,7 @@ async def update_order_status(
                         }
                     }
                 )
+                catalog_cache.invalidate_product(product_id)
 
     if status == "delivered" and order["status"] != "delivered":
         await create_notification(
@@ -2614,7 +2784,7 @@ async def confirm_order_shipping(
     try:
         # 1. Get Waybill
         # We fetch it explicitly to ensure we have it for DB before/during creation
-        waybill = delhivery_client.fetch_waybill()
+        waybill = await delhivery_client.fetch_waybill()
         print(f"Fetched Waybill: {waybill}")
 
         if not waybill:
@@ -2625,7 +2795,7 @@ async def confirm_order_shipping(
         items = order.get("items", [])
         
         # Call create_shipment
-        create_resp = delhivery_client.create_shipment(
+        create_resp = await delhivery_client.create_shipment(
             order=order,
             user={"name": addr.get("name"), "phone": addr.get("phone")}, # Placeholder
             address=addr,
@@ -2642,7 +2812,7 @@ async def confirm_order_shipping(
         pickup_success = False
         pickup_message = ""
         try:
-             pickup_resp = delhivery_client.schedule_pickup(
+             pickup_resp = await delhivery_client.schedule_pickup(
                  pickup_time=pickup_time,
                  pickup_date=pickup_date,
                  pickup_location=delhivery_client.warehouse_name,
@@ -2673,10 +2843,13 @@ async def confirm_order_shipping(
                     "delhivery_waybill": waybill,
                     "tracking_id": waybill,
                     "courier_name": "Delhivery",
-                    "label_url": f"/api/admin/orders/{order_id}/label" 
+                    "label_url": f"/api/admin/orders/{order_id}/label",
+                    "updated_at": datetime.now(timezone.utc)
                 }
             }
         )
+        if isinstance(order.get("created_at"), datetime):
+            daily_rollups.touch(order["created_at"])
         
         # Create Notification
         await create_notification(
@@ -2727,7 +2900,7 @@ async def get_delhivery_label(order_id: str, admin: Dict = Depends(get_current_a
     wb = order.get("delhivery_waybill")
     
     try:
-        pdf_content = delhivery_client.get_label_pdf(wb)
+        pdf_content = await delhivery_client.get_label_pdf(wb)
         
         # Validate content looks like PDF
         if pdf_content.startswith(b"%PDF"):
@@ -2765,7 +2938,7 @@ async def get_order_invoice(order_id: str, admin: Dict = Depends(get_current_adm
             label_path = candidate_url
 
     if not label_path:
-        label_path, error = generate_order_label(order)
+        label_path, error = await invoice_renderer.render(order)
         if not label_path:
             raise HTTPException(status_code=500, detail=f"Failed to generate invoice: {error or 'PDF service unavailable'}")
         await db.orders.update_one(
@@ -2793,7 +2966,7 @@ async def get_order_invoice(order_id: str, admin: Dict = Depends(get_current_adm
         raise HTTPException(status_code=400, detail="Invalid invoice path")
 
     if not file_path.exists():
-        new_label_path, error = generate_order_label(order)
+        new_label_path, error = await invoice_renderer.render(order)
         if not new_label_path:
             raise HTTPException(status_code=500, detail=f"Failed to generate invoice: {error or 'Unknown error'}")
         await db.orders.update_one(
@@ -2843,7 +3016,6 @@ async def create_review(review_data: ReviewCreate, current_user: Dict = Depends(
     )
     
     review_dict = review.model_dump()
-    review_dict['created_at'] = review_dict['created_at'].isoformat()
     
     await db.reviews.insert_one(review_dict)
     
@@ -2860,13 +3032,13 @@ async def create_review(review_data: ReviewCreate, current_user: Dict = Depends(
             }
         }
     )
+    catalog_cache.invalidate_product(review_data.product_id)
     
     return review
 
 # ==================== Categories ====================
 
-@api_router.get("/categories")
-async def get_categories():
+async def list_categories() -> List[Dict[str, str]]:
     categories = [
         {"name": "Sarees", "slug": "sarees", "image": "https://images.unsplash.com/photo-1610030469983-98e550d6193c?w=400"},
         {"name": "T-Shirts", "slug": "t-shirts", "image": "https://images.unsplash.com/photo-1521572163474-6864f9cf17ab?w=400"},
@@ -2879,30 +3051,26 @@ async def get_categories():
     ]
     return categories
 
+@api_router.get("/categories")
+async def get_categories():
+    return await cached_response("categories", None, list_categories)
+
 # ==================== CMS Routes ====================
 
 @api_router.get("/cms/{slug}")
 async def get_cms_page(slug: str):
-    page = await db.cms_pages.find_one({"slug": slug}, {"_id": 0})
-    if not page:
-        raise HTTPException(status_code=404, detail="Page not found")
-    
-    if isinstance(page.get('created_at'), str):
-        page['created_at'] = datetime.fromisoformat(page['created_at'])
-    if isinstance(page.get('updated_at'), str):
-        page['updated_at'] = datetime.fromisoformat(page['updated_at'])
-    
-    return page
+    async def build():
+        page = await db.cms_pages.find_one({"slug": slug}, {"_id": 0})
+        if not page:
+            raise HTTPException(status_code=404, detail="Page not found")
+        return page
+    return await cached_response("cms", slug, build)
 
 @api_router.get("/cms")
 async def get_all_cms_pages():
-    pages = await db.cms_pages.find({}, {"_id": 0}).to_list(100)
-    for page in pages:
-        if isinstance(page.get('created_at'), str):
-            page['created_at'] = datetime.fromisoformat(page['created_at'])
-        if isinstance(page.get('updated_at'), str):
-            page['updated_at'] = datetime.fromisoformat(page['updated_at'])
-    return pages
+    async def build():
+        return await db.cms_pages.find({}, {"_id": 0}).to_list(100)
+    return await cached_response("cms", None, build)
 
 @api_router.put("/admin/cms/{slug}")
 async def update_cms_page(slug: str, page_data: CMSPageUpdate, admin: Dict = Depends(get_current_admin)):
@@ -2916,8 +3084,6 @@ async def update_cms_page(slug: str, page_data: CMSPageUpdate, admin: Dict = Dep
             meta_description=page_data.meta_description
         )
         page_dict = new_page.model_dump()
-        page_dict['created_at'] = page_dict['created_at'].isoformat()
-        page_dict['updated_at'] = page_dict['updated_at'].isoformat()
         await db.cms_pages.insert_one(page_dict)
     else:
         # Update existing
@@ -2928,11 +3094,12 @@ async def update_cms_page(slug: str, page_data: CMSPageUpdate, admin: Dict = Dep
                     "title": page_data.title,
                     "content": page_data.content,
                     "meta_description": page_data.meta_description,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
+                    "updated_at": datetime.now(timezone.utc)
                 }
             }
         )
     
+    response_cache.invalidate("cms")
     updated_page = await db.cms_pages.find_one({"slug": slug}, {"_id": 0})
     return updated_page
 
@@ -2942,14 +3109,11 @@ async def update_cms_page(slug: str, page_data: CMSPageUpdate, admin: Dict = Dep
 async def upload_file(file: UploadFile = File(...)):
     """Upload a file"""
     try:
-        contents = await file.read()
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        file_path = uploads_dir / filename
+        stored = await upload_store.save(file)
+        # A duplicate may be a legacy upload that never got variants
+        image_pipeline.enqueue(stored["filename"], missing_only=stored["deduplicated"])
         
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        
-        return {"filename": filename, "path": f"/uploads/{filename}"}
+        return stored
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2957,27 +3121,16 @@ async def upload_file(file: UploadFile = File(...)):
 async def upload_multiple_files(files: List[UploadFile] = File(...)):
     """Upload multiple files"""
     try:
-        uploaded_files = []
-
-        for file in files:
-            contents = await file.read()
-            filename = f"{uuid.uuid4()}_{file.filename}"
-            file_path = uploads_dir / filename
-
-            with open(file_path, "wb") as f:
-                f.write(contents)
-
-            uploaded_files.append({
-                "filename": filename,
-                "path": f"/uploads/{filename}"
-            })
+        uploaded_files = await asyncio.gather(*(upload_store.save(file) for file in files))
+        for stored in uploaded_files:
+            image_pipeline.enqueue(stored["filename"], missing_only=stored["deduplicated"])
 
         return {"files": uploaded_files}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/image")
-async def get_optimized_image(path: str, w: Optional[int] = None, h: Optional[int] = None, q: int = 85, fit: str = "contain"):
+async def get_optimized_image(request: Request, path: str, w: Optional[int] = None, h: Optional[int] = None, q: int = 85, fit: str = "contain"):
     try:
         # URL decode the path
         path = unquote(path)
@@ -3022,38 +3175,40 @@ async def get_optimized_image(path: str, w: Optional[int] = None, h: Optional[in
             logging.warning(f"Image not found: {source_path}")
             return Response(status_code=404, content=b"", media_type="image/png", headers={"Cross-Origin-Resource-Policy": "cross-origin", "Cache-Control": "no-store"})
         
-        # Create cache directory if it doesn't exist
-        cache_dir = uploads_dir / "cache"
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Use the full relative path (including subdirectories) for cache key
-        cache_key = f"{relative_path}:{w}:{h}:{q}:{fit}"
-        cache_name = hashlib.sha256(cache_key.encode()).hexdigest()[:24] + ".jpg"
-        cache_path = cache_dir / cache_name
+        # Pick WebP/AVIF for clients that accept them; responses vary on Accept from here on
+        fmt = negotiate_format(request.headers.get("accept"))
+        _, media_type, extension = OUTPUT_FORMATS[fmt]
         
-        if cache_path.exists():
-            resp = FileResponse(str(cache_path), media_type="image/jpeg")
-            resp.headers["Cross-Origin-Resource-Policy"] = "cross-origin"
-            return resp
-        
-        # Open and process the image
-        img = Image.open(str(source_path))
-        if not w and not h:
-            w = 800
-        if fit == "cover" and w and h:
-            img = ImageOps.fit(img, (w, h))
+        # Prefer a variant rendered at upload time; otherwise snap size/quality to the allowed
+        # steps and key the on-demand derivative on the full relative path and output format
+        variant_path = image_pipeline.nearest_variant(relative_path, source_path, w, h, fit, fmt)
+        if variant_path:
+            etag = image_etag(str(variant_path.relative_to(uploads_dir)), source_path)
         else:
-            target_w = w or img.width
-            target_h = h or img.height
-            img = ImageOps.contain(img, (target_w, target_h))
+            w, h, q, fit = image_cache.normalize(w, h, q, fit)
+            cache_key = f"{relative_path}:{w}:{h}:{q}:{fit}:{fmt}"
+            cache_name = hashlib.sha256(cache_key.encode()).hexdigest()[:24] + "." + extension
+            cache_path = uploads_dir / "cache" / cache_name
+            etag = image_etag(cache_key, source_path)
+        
+        headers = {
+            "Cross-Origin-Resource-Policy": "cross-origin",
+            "Vary": "Accept",
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        }
+        # Revalidation needs no file or PIL work at all
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        if variant_path:
+            return FileResponse(str(variant_path), media_type=media_type, headers=headers)
         
-        # Save to cache
-        with open(cache_path, "wb") as f:
-            img.convert("RGB").save(f, format="JPEG", quality=q, optimize=True)
+        if not image_cache.lookup(cache_path):
+            # Resize on the transform pool; identical concurrent requests share one render
+            await image_pipeline.transform(source_path, cache_path, w, h, fit, fmt, q)
         
-        resp = FileResponse(str(cache_path), media_type="image/jpeg")
-        resp.headers["Cross-Origin-Resource-Policy"] = "cross-origin"
-        return resp
+        return FileResponse(str(cache_path), media_type=media_type, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -3080,7 +3235,6 @@ async def create_audit_log(admin_id: str, admin_username: str, action: str, deta
         ip_address=ip_address
     )
     log_dict = log.model_dump()
-    log_dict['created_at'] = log_dict['created_at'].isoformat()
     await db.audit_logs.insert_one(log_dict)
 
     
@@ -3105,41 +3259,48 @@ async def get_audit_logs(admin: Dict = Depends(get_current_admin), limit: int =
 
 # ==================== Admin Orders Management ====================
 
-@api_router.get("/admin/orders")
-async def get_admin_orders(
-    page: int = 1,
-    limit: int = 50,
-    status: Optional[str] = None,
-    user_id: Optional[str] = None,
-    admin: Dict = Depends(get_current_admin)
-):
-    """Get all orders for admin management"""
-    try:
-        # Build filter
-        filter_dict = {}
-        if status:
-            filter_dict["status"] = status
-        if user_id:
-            filter_dict["user_id"] = user_id
-
-        # Calculate skip
-        skip = (page - 1) * limit
-
-        # Get orders with pagination
-        orders = await db.orders.find(filter_dict).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-        
-        # Get total count
-        total = await db.orders.count_documents(filter_dict)
-
-        return {
-            "orders": orders,
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "pages": (total + limit - 1) // limit
+def analytics_event_documents(
+    events: List[SiteAnalyticsEventCreate],
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials]
+) -> List[Dict[str, Any]]:
+    """Build site_analytics documents as plain dicts, decoding the token once per request."""
+    user_id = None
+    if credentials and credentials.credentials:
+        try:
+            payload = jose_jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            user_id = payload.get("user_id")
+        except Exception:
+            user_id = None
+    request_metadata = {"user_agent": request.headers.get("user-agent")}
+    if request.client:
+        request_metadata["ip"] = request.client.host
+    created_at = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "session_id": event.session_id,
+            "event_type": event.event_type,
+            "page": event.page,
+            "product_id": event.product_id,
+            "metadata": {**(event.metadata or {}), **request_metadata},
+            "created_at": created_at
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching orders: {str(e)}")
+        for event in events
+    ]
+
+def buffer_analytics_events(documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if db is None:
+        return {"status": "ok", "accepted": 0}
+    if not analytics_buffer.add(documents):
+        # Buffer full (database slow or unreachable): ask clients to retry instead of growing without bound
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics ingestion is busy, retry later",
+            headers={"Retry-After": str(max(1, int(ANALYTICS_FLUSH_INTERVAL)))}
+        )
+    return {"status": "ok", "accepted": len(documents)}
 
 @api_router.post("/analytics/events")
 async def track_site_analytics_event(
@@ -3147,36 +3308,16 @@ async def track_site_analytics_event(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
 ):
-    try:
-        user_id = None
-        if credentials and credentials.credentials:
-            try:
-                payload = jose_jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-                user_id = payload.get("user_id")
-            except Exception:
-                user_id = None
-        metadata = event.metadata or {}
-        metadata = dict(metadata)
-        metadata["user_agent"] = request.headers.get("user-agent")
-        if request.client:
-            metadata["ip"] = request.client.host
-        analytics_event = SiteAnalyticsEvent(
-            user_id=user_id,
-            session_id=event.session_id,
-            event_type=event.event_type,
-            page=event.page,
-            product_id=event.product_id,
-            metadata=metadata
-        )
-        event_dict = analytics_event.model_dump()
-        created_at = event_dict.get("created_at")
-        if isinstance(created_at, datetime):
-            event_dict["created_at"] = created_at.isoformat()
-        if db is not None:
-            await db.site_analytics.insert_one(event_dict)
-        return {"status": "ok"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error tracking analytics event: {str(e)}")
+    return buffer_analytics_events(analytics_event_documents([event], request, credentials))
+
+@api_router.post("/analytics/events/batch")
+async def track_site_analytics_events_batch(
+    batch: SiteAnalyticsEventBatch,
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Up to 100 events per request, e.g. queued by the storefront and sent together"""
+    return buffer_analytics_events(analytics_event_documents(batch.events, request, credentials))
 
 @api_router.get("/admin/analytics/site")
 async def get_site_analytics(
@@ -3187,90 +3328,19 @@ async def get_site_analytics(
     try:
         from_dt = datetime.fromisoformat(from_date.replace('Z', '+00:00')) if from_date else datetime.now(timezone.utc) - timedelta(days=30)
         to_dt = datetime.fromisoformat(to_date.replace('Z', '+00:00')) if to_date else datetime.now(timezone.utc)
-        date_filter = {
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}
-        }
-        total_visits = await db.site_analytics.count_documents({
-            **date_filter,
-            "event_type": "page_view"
-        })
-        total_product_views = await db.site_analytics.count_documents({
-            **date_filter,
-            "event_type": "product_view"
-        })
-        total_clicks = await db.site_analytics.count_documents({
-            **date_filter,
-            "event_type": "click"
-        })
-        traffic_pipeline = [
-            {"$match": date_filter},
-            {"$group": {
-                "_id": {
-                    "year": {"$year": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "month": {"$month": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "day": {"$dayOfMonth": {"$dateFromString": {"dateString": "$created_at"}}}
-                },
-                "visits": {
-                    "$sum": {
-                        "$cond": [
-                            {"$eq": ["$event_type", "page_view"]},
-                            1,
-                            0
-                        ]
-                    }
-                },
-                "productViews": {
-                    "$sum": {
-                        "$cond": [
-                            {"$eq": ["$event_type", "product_view"]},
-                            1,
-                            0
-                        ]
-                    }
-                },
-                "clicks": {
-                    "$sum": {
-                        "$cond": [
-                            {"$eq": ["$event_type", "click"]},
-                            1,
-                            0
-                        ]
-                    }
-                }
-            }},
-            {"$project": {
-                "period": {
-                    "$dateFromParts": {
-                        "year": "$_id.year",
-                        "month": "$_id.month",
-                        "day": "$_id.day"
-                    }
-                },
-                "visits": 1,
-                "productViews": 1,
-                "clicks": 1
-            }},
-            {"$sort": {"period": 1}}
-        ]
-        traffic_over_time = await db.site_analytics.aggregate(traffic_pipeline).to_list(365)
-        for item in traffic_over_time:
-            period = item.get("period")
-            if isinstance(period, datetime):
-                item["period"] = period.strftime("%Y-%m-%d")
-        product_pipeline = [
-            {"$match": {
-                **date_filter,
-                "product_id": {"$ne": None}
-            }},
-            {"$group": {
-                "_id": "$product_id",
-                "visits": {"$sum": 1}
-            }},
-            {"$sort": {"visits": -1}},
-            {"$limit": 50}
+        days = await daily_rollups.read(from_dt, to_dt)
+        summary = daily_rollups.summarize(days)
+        traffic_over_time = [
+            {
+                "period": day["_id"].strftime("%Y-%m-%d"),
+                "visits": day["events"].get("page_view", 0),
+                "productViews": day["events"].get("product_view", 0),
+                "clicks": day["events"].get("click", 0)
+            }
+            for day in days
         ]
-        product_stats = await db.site_analytics.aggregate(product_pipeline).to_list(50)
-        product_ids = [item["_id"] for item in product_stats if item.get("_id")]
+        product_stats = sorted(summary["products"].items(), key=lambda item: item[1], reverse=True)[:50]
+        product_ids = [product_id for product_id, _ in product_stats if product_id]
         products_cursor = db.products.find(
             {"id": {"$in": product_ids}},
             {"_id": 0, "id": 1, "title": 1}
@@ -3278,38 +3348,25 @@ async def get_site_analytics(
         products_list = await products_cursor.to_list(len(product_ids) or 50)
         products_map = {p["id"]: p for p in products_list}
         product_visits = []
-        for item in product_stats:
-            product_id = item.get("_id")
-            if not product_id:
-                continue
+        for product_id, visits in product_stats:
             product = products_map.get(product_id)
             if not product:
                 continue
             product_visits.append({
                 "productId": product_id,
                 "title": product.get("title", "Unknown Product"),
-                "visits": item.get("visits", 0)
+                "visits": visits
             })
-        page_pipeline = [
-            {"$match": date_filter},
-            {"$group": {
-                "_id": "$page",
-                "visits": {"$sum": 1}
-            }},
-            {"$project": {
-                "page": "$_id",
-                "visits": 1
-            }},
-            {"$sort": {"visits": -1}},
-            {"$limit": 50}
+        page_views = [
+            {"_id": page, "page": page, "visits": visits}
+            for page, visits in sorted(summary["pages"].items(), key=lambda item: item[1], reverse=True)[:50]
         ]
-        page_views = await db.site_analytics.aggregate(page_pipeline).to_list(50)
         most_viewed_products = product_visits[:10]
         return {
             "summary": {
-                "totalVisits": total_visits,
-                "totalProductViews": total_product_views,
-                "totalClicks": total_clicks
+                "totalVisits": summary["events"].get("page_view", 0),
+                "totalProductViews": summary["events"].get("product_view", 0),
+                "totalClicks": summary["events"].get("click", 0)
             },
             "trafficOverTime": traffic_over_time,
             "productVisits": product_visits,
@@ -3334,26 +3391,16 @@ async def get_analytics_overview(
         
         # Get basic counts
         total_products = await db.products.count_documents({})
-        total_orders = await db.orders.count_documents({
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}
-        })
         total_users = await db.users.count_documents({})
         
-        # Calculate revenue
-        revenue_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {"_id": None, "total_revenue": {"$sum": "$total"}}}
-        ]
-        revenue_result = await db.orders.aggregate(revenue_pipeline).to_list(1)
-        total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
+        # Orders and revenue from the per-day rollups
+        summary = daily_rollups.summarize(await daily_rollups.read(from_dt, to_dt))
+        total_orders = summary["orders"]
+        total_revenue = summary["revenue"]
         
         # Recent orders (last 7 days)
-        recent_orders = await db.orders.count_documents({
-            "created_at": {"$gte": (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()}
-        })
+        now = datetime.now(timezone.utc)
+        recent_orders = daily_rollups.summarize(await daily_rollups.read(now - timedelta(days=6), now))["orders"]
         
         # Calculate conversion rate (simplified)
         conversion_rate = (total_orders / max(total_users, 1)) * 100 if total_users > 0 else 0
@@ -3411,7 +3458,7 @@ async def get_products_analytics(
                 {"$unwind": "$items"},
                 {"$match": {
                     "$or": [
-                        {"created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}},
+                        {"created_at": {"$gte": from_dt, "$lte": to_dt}},
                         {"created_at": {"$exists": False}}  # Include orders without dates
                     ],
                     "$or": [
@@ -3504,32 +3551,19 @@ async def get_products_analytics(
             print(f"Error in category statistics pipeline: {str(e)}")
             category_stats = []
         
-        # Price distribution
-        price_ranges = [
-            {"range": "Under ₹500", "min": 0, "max": 500},
-            {"range": "₹500 - ₹1000", "min": 500, "max": 1000},
-            {"range": "₹1000 - ₹2000", "min": 1000, "max": 2000},
-            {"range": "₹2000 - ₹5000", "min": 2000, "max": 5000},
-            {"range": "Above ₹5000", "min": 5000, "max": float('inf')}
-        ]
+        # Price distribution, one $bucket aggregation
+        try:
+            price_rows = await db.products.aggregate(price_bucket_stages()).to_list(len(PRICE_BUCKETS))
+        except Exception as e:
+            print(f"Error in price distribution pipeline: {str(e)}")
+            price_rows = []
         
         price_distribution = []
-        total_products_for_dist = total_products
-        
-        async def count_price_range(range_def):
-            if range_def["max"] == float('inf'):
-                return await db.products.count_documents({"price": {"$gte": range_def["min"]}})
-            return await db.products.count_documents({
-                "price": {"$gte": range_def["min"], "$lt": range_def["max"]}
-            })
-        
-        counts = await asyncio.gather(*(count_price_range(r) for r in price_ranges))
-        
-        for range_def, count in zip(price_ranges, counts):
-            percentage = (count / max(total_products_for_dist, 1)) * 100
+        for bucket in label_price_buckets(price_rows):
+            percentage = (bucket["count"] / max(total_products, 1)) * 100
             price_distribution.append({
-                "range": range_def["range"],
-                "count": count,
+                "range": bucket["range"],
+                "count": bucket["count"],
                 "percentage": round(percentage, 1)
             })
         
@@ -3556,121 +3590,51 @@ async def get_orders_analytics(
 ):
     """Get orders analytics data"""
     try:
-        from_dt = datetime.fromisoformat(from_date) if from_date else datetime.now(timezone.utc) - timedelta(days=30)
-        to_dt = datetime.fromisoformat(to_date) if to_date else datetime.now(timezone.utc)
-        
-        # Performance metrics
-        total_orders = await db.orders.count_documents({
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}
-        })
-        
-        # Get shipped and delivered orders
-        shipped_orders = await db.orders.count_documents({
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-            "status": "shipped"
-        })
-        
-        completed_orders = await db.orders.count_documents({
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-            "status": "delivered"
-        })
-        
-        # Average order value
-        avg_order_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {"_id": None, "avg_value": {"$avg": "$total"}}}
-        ]
-        avg_result = await db.orders.aggregate(avg_order_pipeline).to_list(1)
-        average_order_value = avg_result[0]["avg_value"] if avg_result else 0
-        
-        # Cancellation rate
-        cancelled_orders = await db.orders.count_documents({
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-            "status": "cancelled"
-        })
-        cancellation_rate = (cancelled_orders / max(total_orders, 1)) * 100
-        
-        # Status distribution
-        status_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}
-            }},
-            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
-            {"$project": {
-                "status": "$_id",
-                "count": 1,
-                "percentage": {"$multiply": [{"$divide": ["$count", total_orders]}, 100]}
-            }},
-            {"$sort": {"count": -1}}
-        ]
-        status_distribution = await db.orders.aggregate(status_pipeline).to_list(10)
-        
-        # Payment method statistics
-        payment_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}
-            }},
-            {"$group": {"_id": "$payment_method", "count": {"$sum": 1}}},
-            {"$project": {
-                "method": "$_id",
-                "count": 1,
-                "percentage": {"$multiply": [{"$divide": ["$count", total_orders]}, 100]}
-            }},
-            {"$sort": {"count": -1}}
-        ]
-        payment_method_stats = await db.orders.aggregate(payment_pipeline).to_list(10)
-        
-        # Recent orders with customer details
-        recent_orders = await db.orders.find(
-            {"created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}},
-            {"_id": 0}
-        ).sort("created_at", -1).limit(20).to_list(20)
-        
-        # Add customer details to recent orders
-        for order in recent_orders:
-            user = await db.users.find_one({"id": order["user_id"]}, {"_id": 0})
-            if user:
-                order["customer_name"] = user.get("name", "Unknown")
-                order["customer_email"] = user.get("email", "Unknown")
+        from_dt = datetime.fromisoformat(from_date.replace('Z', '+00:00')) if from_date else datetime.now(timezone.utc) - timedelta(days=30)
+        to_dt = datetime.fromisoformat(to_date.replace('Z', '+00:00')) if to_date else datetime.now(timezone.utc)
         
-        # Order trends (daily)
-        trend_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {
-                "_id": {
-                    "year": {"$year": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "month": {"$month": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "day": {"$dayOfMonth": {"$dateFromString": {"dateString": "$created_at"}}}
-                },
-                "orders": {"$sum": 1},
-                "revenue": {"$sum": "$total"}
-            }},
-            {"$project": {
-                "period": {
-                    "$dateFromParts": {
-                        "year": "$_id.year",
-                        "month": "$_id.month",
-                        "day": "$_id.day"
-                    }
-                },
-                "orders": 1,
-                "revenue": 1
-            }},
-            {"$sort": {"period": -1}},
-            {"$limit": 7}
+        # Counts, AOV, status/payment splits, daily trends and the latest orders in one pass over the range
+        live = {"$ne": ["$status", "cancelled"]}
+        orders_pipeline = [
+            {"$match": {"created_at": {"$gte": from_dt, "$lte": to_dt}}},
+            {"$facet": {
+                "totals": [
+                    {"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "shipped": {"$sum": {"$cond": [{"$eq": ["$status", "shipped"]}, 1, 0]}},
+                        "delivered": {"$sum": {"$cond": [{"$eq": ["$status", "delivered"]}, 1, 0]}},
+                        "cancelled": {"$sum": {"$cond": [live, 0, 1]}},
+                        "live_revenue": {"$sum": {"$cond": [live, "$total", 0]}}
+                    }}
+                ],
+                "statuses": [
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": 10}
+                ],
+                "payments": [
+                    {"$group": {"_id": "$payment_method", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": 10}
+                ],
+                "trends": [
+                    {"$match": {"status": {"$ne": "cancelled"}}},
+                    {"$group": {
+                        "_id": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+                        "orders": {"$sum": 1},
+                        "revenue": {"$sum": "$total"}
+                    }},
+                    {"$sort": {"_id": -1}},
+                    {"$limit": 7}
+                ],
+                "recent": [
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": 20},
+                    {"$project": {"_id": 0}}
+                ]
+            }}
         ]
-        order_trends = await db.orders.aggregate(trend_pipeline).to_list(7)
-        
-        # Format trends data
-        for trend in order_trends:
-            trend["period"] = trend["period"].strftime("%Y-%m-%d")
-            trend["growth"] = 0  # Simplified - would need previous period data
         
         # Get sold stock information
         sold_stock_pipeline = [
@@ -3697,7 +3661,49 @@ async def get_orders_analytics(
                 "current_stock": "$product.stock"
             }}
         ]
-        sold_stock_data = await db.orders.aggregate(sold_stock_pipeline).to_list(100)
+        faceted, sold_stock_data = await asyncio.gather(
+            db.orders.aggregate(orders_pipeline).to_list(1),
+            db.orders.aggregate(sold_stock_pipeline).to_list(100)
+        )
+        faceted = faceted[0] if faceted else {}
+        totals = (faceted.get("totals") or [{}])[0]
+        total_orders = totals.get("total", 0)
+        cancelled_orders = totals.get("cancelled", 0)
+        live_orders = total_orders - cancelled_orders
+        average_order_value = totals.get("live_revenue", 0) / live_orders if live_orders else 0
+        cancellation_rate = (cancelled_orders / max(total_orders, 1)) * 100
+        
+        status_distribution = [
+            {"_id": row["_id"], "status": row["_id"], "count": row["count"], "percentage": row["count"] / total_orders * 100}
+            for row in faceted.get("statuses", [])
+        ]
+        payment_method_stats = [
+            {"_id": row["_id"], "method": row["_id"], "count": row["count"], "percentage": row["count"] / total_orders * 100}
+            for row in faceted.get("payments", [])
+        ]
+        order_trends = [
+            {
+                "_id": row["_id"],
+                "period": row["_id"].strftime("%Y-%m-%d"),
+                "orders": row["orders"],
+                "revenue": row["revenue"],
+                "growth": 0  # Simplified - would need previous period data
+            }
+            for row in faceted.get("trends", [])
+        ]
+        
+        # Customer details for the recent orders with a single $in lookup
+        recent_orders = faceted.get("recent", [])
+        user_ids = list({order["user_id"] for order in recent_orders if order.get("user_id")})
+        users = await db.users.find(
+            {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1}
+        ).to_list(len(user_ids)) if user_ids else []
+        users_by_id = {user["id"]: user for user in users}
+        for order in recent_orders:
+            user = users_by_id.get(order.get("user_id"))
+            if user:
+                order["customer_name"] = user.get("name", "Unknown")
+                order["customer_email"] = user.get("email", "Unknown")
         
         return {
             "recentOrders": recent_orders,
@@ -3707,8 +3713,8 @@ async def get_orders_analytics(
             "soldStockData": sold_stock_data,
             "performanceMetrics": {
                 "totalOrders": total_orders,
-                "shippedOrders": shipped_orders,
-                "completedOrders": completed_orders,
+                "shippedOrders": totals.get("shipped", 0),
+                "completedOrders": totals.get("delivered", 0),
                 "averageOrderValue": round(average_order_value, 2),
                 "cancellationRate": round(cancellation_rate, 2)
             }
@@ -3731,12 +3737,12 @@ async def get_users_analytics(
         total_users = await db.users.count_documents({})
         
         new_users = await db.users.count_documents({
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}
+            "created_at": {"$gte": from_dt, "$lte": to_dt}
         })
         
         # Active users (users who made purchases in the period)
         active_users = await db.orders.distinct("user_id", {
-            "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
+            "created_at": {"$gte": from_dt, "$lte": to_dt},
             "status": {"$ne": "cancelled"}
         })
         active_users_count = len(active_users)
@@ -3744,7 +3750,7 @@ async def get_users_analytics(
         # Average order value per customer
         avg_order_pipeline = [
             {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
+                "created_at": {"$gte": from_dt, "$lte": to_dt},
                 "status": {"$ne": "cancelled"}
             }},
             {"$group": {"_id": None, "avg_value": {"$avg": "$total"}}}
@@ -3840,16 +3846,10 @@ async def get_revenue_analytics(
         from_dt = datetime.fromisoformat(from_date.replace('Z', '+00:00')) if from_date else datetime.now(timezone.utc) - timedelta(days=30)
         to_dt = datetime.fromisoformat(to_date.replace('Z', '+00:00')) if to_date else datetime.now(timezone.utc)
         
-        # Performance metrics
-        total_revenue_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {"_id": None, "total_revenue": {"$sum": "$total"}}}
-        ]
-        total_revenue_result = await db.orders.aggregate(total_revenue_pipeline).to_list(1)
-        total_revenue = total_revenue_result[0]["total_revenue"] if total_revenue_result else 0
+        # Everything below comes from one small document per day
+        days = await daily_rollups.read(from_dt, to_dt)
+        summary = daily_rollups.summarize(days)
+        total_revenue = summary["revenue"]
         
         # Calculate days in period
         days_in_period = (to_dt - from_dt).days + 1
@@ -3859,108 +3859,36 @@ async def get_revenue_analytics(
         revenue_growth = 0  # Placeholder
         
         # Best day revenue
-        best_day_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {
-                "_id": {
-                    "year": {"$year": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "month": {"$month": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "day": {"$dayOfMonth": {"$dateFromString": {"dateString": "$created_at"}}}
-                },
-                "daily_revenue": {"$sum": "$total"}
-            }},
-            {"$sort": {"daily_revenue": -1}},
-            {"$limit": 1}
-        ]
-        best_day_result = await db.orders.aggregate(best_day_pipeline).to_list(1)
-        best_day_revenue = best_day_result[0]["daily_revenue"] if best_day_result else 0
+        best_day_revenue = max((day.get("revenue", 0) for day in days), default=0)
         
-        # Daily revenue trend
-        daily_revenue_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {
-                "_id": {
-                    "year": {"$year": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "month": {"$month": {"$dateFromString": {"dateString": "$created_at"}}},
-                    "day": {"$dayOfMonth": {"$dateFromString": {"dateString": "$created_at"}}}
-                },
-                "revenue": {"$sum": "$total"}
-            }},
-            {"$project": {
-                "date": {
-                    "$dateFromParts": {
-                        "year": "$_id.year",
-                        "month": "$_id.month",
-                        "day": "$_id.day"
-                    }
-                },
-                "revenue": 1
-            }},
-            {"$sort": {"date": -1}},
-            {"$limit": 30}
-        ]
-        daily_revenue = await db.orders.aggregate(daily_revenue_pipeline).to_list(30)
-        
-        # Format daily revenue data
-        for day in daily_revenue:
-            day["date"] = day["date"].strftime("%Y-%m-%d")
+        # Daily revenue trend (latest 30 days with orders)
+        daily_revenue = [
+            {"date": day["_id"].strftime("%Y-%m-%d"), "revenue": day["revenue"]}
+            for day in reversed(days) if day.get("orders", 0) > day.get("cancelled", 0)
+        ][:30]
         
         # Payment method revenue
-        payment_revenue_pipeline = [
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$group": {
-                "_id": "$payment_method",
-                "revenue": {"$sum": "$total"},
-                "count": {"$sum": 1}
-            }},
-            {"$project": {
-                "method": "$_id",
-                "revenue": 1,
-                "count": 1,
-                "percentage": {"$multiply": [{"$divide": ["$revenue", total_revenue]}, 100]} if total_revenue > 0 else 0
-            }},
-            {"$sort": {"revenue": -1}}
-        ]
-        payment_method_revenue = await db.orders.aggregate(payment_revenue_pipeline).to_list(10)
+        payment_method_revenue = sorted([
+            {
+                "method": method,
+                "revenue": totals["revenue"],
+                "count": totals["count"],
+                "percentage": (totals["revenue"] / total_revenue) * 100 if total_revenue > 0 else 0
+            }
+            for method, totals in summary["payments"].items() if totals["revenue"] > 0
+        ], key=lambda row: row["revenue"], reverse=True)
         
         # Category revenue
-        category_revenue_pipeline = [
-            {"$unwind": "$items"},
-            {"$match": {
-                "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                "status": {"$ne": "cancelled"}
-            }},
-            {"$lookup": {
-                "from": "products",
-                "localField": "items.product_id",
-                "foreignField": "id",
-                "as": "product"
-            }},
-            {"$unwind": "$product"},
-            {"$group": {
-                "_id": "$product.category",
-                "revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}},
-                "orderCount": {"$sum": 1}
-            }},
-            {"$project": {
-                "name": "$_id",
-                "revenue": 1,
-                "orderCount": 1,
-                "averageOrderValue": {"$divide": ["$revenue", "$orderCount"]},
+        category_revenue = sorted([
+            {
+                "name": name,
+                "revenue": totals["revenue"],
+                "orderCount": totals["items"],
+                "averageOrderValue": totals["revenue"] / totals["items"] if totals["items"] else 0,
                 "growth": 0  # Placeholder
-            }},
-            {"$sort": {"revenue": -1}}
-        ]
-        category_revenue = await db.orders.aggregate(category_revenue_pipeline).to_list(20)
+            }
+            for name, totals in summary["categories"].items()
+        ], key=lambda row: row["revenue"], reverse=True)[:20]
         
         # Monthly revenue comparison (simplified)
         monthly_revenue = [
@@ -3991,6 +3919,21 @@ async def get_revenue_analytics(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching revenue analytics: {str(e)}")
 
+@api_router.post("/admin/analytics/rollups/rebuild")
+async def rebuild_daily_rollups(
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    admin: Dict = Depends(get_current_admin)
+):
+    """Recompute daily_stats for a date range (default: the last 30 days), e.g. after a data fix"""
+    try:
+        from_dt = datetime.fromisoformat(from_date.replace('Z', '+00:00')) if from_date else datetime.now(timezone.utc) - timedelta(days=30)
+        to_dt = datetime.fromisoformat(to_date.replace('Z', '+00:00')) if to_date else datetime.now(timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    days = await daily_rollups.rebuild(from_dt, to_dt + timedelta(days=1))
+    return {"message": "Daily stats rebuilt", "days": days}
+
 @api_router.get("/admin/analytics/export/{data_type}")
 async def get_analytics_export(
     data_type: str,
@@ -4013,7 +3956,7 @@ async def get_analytics_export(
         elif data_type == "orders":
             # Export orders data
             orders = await db.orders.find(
-                {"created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()}},
+                {"created_at": {"$gte": from_dt, "$lte": to_dt}},
                 {"_id": 0}
             ).to_list(1000)
             csv_data = "Order Number,Customer ID,Status,Payment Method,Total,Date\n"
@@ -4029,38 +3972,11 @@ async def get_analytics_export(
         
         elif data_type == "revenue":
             # Export revenue data
-            revenue_pipeline = [
-                {"$match": {
-                    "created_at": {"$gte": from_dt.isoformat(), "$lte": to_dt.isoformat()},
-                    "status": {"$ne": "cancelled"}
-                }},
-                {"$group": {
-                    "_id": {
-                        "year": {"$year": {"$dateFromString": {"dateString": "$created_at"}}},
-                        "month": {"$month": {"$dateFromString": {"dateString": "$created_at"}}},
-                        "day": {"$dayOfMonth": {"$dateFromString": {"dateString": "$created_at"}}}
-                    },
-                    "revenue": {"$sum": "$total"},
-                    "orders": {"$sum": 1}
-                }},
-                {"$project": {
-                    "date": {
-                        "$dateFromParts": {
-                            "year": "$_id.year",
-                            "month": "$_id.month",
-                            "day": "$_id.day"
-                        }
-                    },
-                    "revenue": 1,
-                    "orders": 1
-                }},
-                {"$sort": {"date": 1}}
-            ]
-            revenue_data = await db.orders.aggregate(revenue_pipeline).to_list(1000)
             csv_data = "Date,Revenue,Orders\n"
-            for data in revenue_data:
-                date_str = data["date"].strftime("%Y-%m-%d")
-                csv_data += f"{date_str},{data['revenue']},{data['orders']}\n"
+            for day in await daily_rollups.read(from_dt, to_dt):
+                orders = day.get("orders", 0) - day.get("cancelled", 0)
+                if orders:
+                    csv_data += f"{day['_id'].strftime('%Y-%m-%d')},{day['revenue']},{orders}\n"
         
         else:
             raise HTTPException(status_code=400, detail="Invalid data type")
@@ -4082,11 +3998,20 @@ async def get_analytics_export(
 async def get_notifications(
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     admin: Dict = Depends(get_current_admin)
 ):
+    sort_spec = [("created_at", -1), ("id", -1)]
     try:
-        cursor = db.notifications.find({}).sort("created_at", -1).skip(skip).limit(limit)
-        notifications = await cursor.to_list(length=limit)
+        query = apply_cursor({}, sort_spec, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    try:
+        notifications_cursor = db.notifications.find(query).sort(sort_spec)
+        if not cursor:
+            notifications_cursor = notifications_cursor.skip(skip)
+        notifications = await notifications_cursor.limit(limit).to_list(length=limit)
+        next_cursor = cursor_from(notifications[-1], sort_spec) if len(notifications) == limit else None
         
         unread_count = await db.notifications.count_documents({"is_read": False})
         
@@ -4121,7 +4046,8 @@ async def get_notifications(
                 
         return {
             "notifications": notifications,
-            "unread_count": unread_count
+            "unread_count": unread_count,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         print(f"Error fetching notifications: {e}")
@@ -4162,6 +4088,34 @@ async def mark_all_notifications_read(
 
 
 
+# ==================== System Routes ====================
+
+@api_router.get("/admin/system/pools")
+async def get_worker_pool_stats(admin: Dict = Depends(get_current_admin)):
+    return {
+        "password_hashing": password_service.stats(),
+        "invoice_rendering": invoice_renderer.stats(),
+        "image_variants": image_pipeline.stats(),
+        "uploads": upload_store.stats()
+    }
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats(admin: Dict = Depends(get_current_admin)):
+    return {
+        "catalog": catalog_cache.stats(),
+        "rotation": product_rotation.stats(),
+        "auth": {
+            "tokens": token_cache.stats(),
+            "principals": principal_cache.stats()
+        },
+        "tracking": tracking_service.stats() if tracking_service else None,
+        "images": image_cache.stats(),
+        "search": search_index.stats(),
+        "responses": response_cache.stats(),
+        "rollups": daily_rollups.stats(),
+        "analytics_buffer": analytics_buffer.stats()
+    }
+
 
 # Include router
 app.include_router(api_router)
@@ -4184,5 +4138,21 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Write out buffered analytics events while the client is still open
+    await analytics_buffer.stop()
+    if date_migration_task and not date_migration_task.done():
+        date_migration_task.cancel()
+    await product_rotation.stop()
+    await daily_rollups.stop()
+    await search_index.stop()
+    await image_cache.stop()
+    if tracking_service:
+        await tracking_service.stop()
+    password_service.shutdown()
+    invoice_renderer.shutdown()
+    image_pipeline.shutdown()
+    upload_store.shutdown()
+    if delhivery_client:
+        delhivery_client.close()
     if client:
         client.close()
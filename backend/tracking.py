@@ -0,0 +1,182 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from cache import TTLCache
+
+
+class TrackingService:
+    """
+    Delhivery shipment tracking served from local data.
+
+    Payloads are cached per waybill for `ttl` seconds, and concurrent requests for the
+    same waybill share one upstream call. A background poller refreshes every waybill
+    still in transit in comma-separated batches and stores the latest scan on its order.
+    Tracking views serve that stored scan while it is younger than one poll interval,
+    so customers refreshing the order page rarely reach Delhivery at all.
+    """
+
+    # Order statuses whose forward shipments are still moving
+    ACTIVE_ORDER_STATUSES = ["confirmed", "processing", "shipped"]
+
+    def __init__(self, client, ttl: float = 300.0, poll_interval: float = 900.0, batch_size: int = 50, max_entries: int = 5000):
+        self.client = client
+        self.cache = TTLCache(max_entries, ttl, name="tracking")
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.db = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.last_poll_at: Optional[str] = None
+        self.last_poll_count = 0
+
+    @staticmethod
+    def split_by_waybill(response: Any) -> Dict[str, Dict[str, Any]]:
+        """
+        Split a multi-waybill tracking response into single-waybill payloads
+        shaped exactly like a one-waybill response
+        """
+        payloads: Dict[str, Dict[str, Any]] = {}
+        if not isinstance(response, dict):
+            return payloads
+        for entry in response.get("ShipmentData") or []:
+            shipment = (entry or {}).get("Shipment") or {}
+            waybill = shipment.get("AWB")
+            if waybill:
+                payloads[str(waybill)] = {**response, "ShipmentData": [entry]}
+        return payloads
+
+    @staticmethod
+    def latest_scan(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        shipments = payload.get("ShipmentData") or []
+        if not shipments:
+            return None
+        status = ((shipments[0] or {}).get("Shipment") or {}).get("Status") or {}
+        if not status:
+            return None
+        return {
+            "status": status.get("Status"),
+            "status_type": status.get("StatusType"),
+            "location": status.get("StatusLocation"),
+            "instructions": status.get("Instructions"),
+            "scanned_at": status.get("StatusDateTime"),
+        }
+
+    def stored_scan(self, order: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The scan the poller stored on `order`, or None if it is missing or older than one poll interval
+        """
+        scan = order.get("tracking_status")
+        synced_at = order.get("tracking_synced_at")
+        if not scan or not isinstance(synced_at, datetime) or self.poll_interval <= 0:
+            return None
+        if synced_at.tzinfo is None:
+            synced_at = synced_at.replace(tzinfo=timezone.utc)
+        if (datetime.now(timezone.utc) - synced_at).total_seconds() > self.poll_interval:
+            return None
+        return scan
+
+    async def _fetch(self, waybills: List[str]) -> Dict[str, Dict[str, Any]]:
+        self.upstream_calls += 1
+        response = await self.client.track_shipment(",".join(waybills))
+        payloads = self.split_by_waybill(response)
+        if len(waybills) == 1 and waybills[0] not in payloads and isinstance(response, dict):
+            # Unexpected shape (e.g. an error body); hand it back to the caller but don't cache it
+            return {waybills[0]: response}
+        scans = {waybill: self.latest_scan(payload) for waybill, payload in payloads.items()}
+        for waybill, payload in payloads.items():
+            # Only real scans are cached, so a transient upstream error isn't served for the whole TTL
+            if scans[waybill]:
+                self.cache.set(waybill, payload)
+        await self._persist({waybill: scan for waybill, scan in scans.items() if scan})
+        return payloads
+
+    async def _persist(self, scans: Dict[str, Dict[str, Any]]):
+        if self.db is None or not scans:
+            return
+        synced_at = datetime.now(timezone.utc)
+        await self.db.orders.bulk_write([
+            UpdateOne(
+                {"delhivery_waybill": waybill},
+                {"$set": {"tracking_status": scan, "tracking_synced_at": synced_at}}
+            )
+            for waybill, scan in scans.items()
+        ], ordered=False)
+
+    async def track(self, waybill: str) -> Dict[str, Any]:
+        cached = self.cache.get(waybill)
+        if cached is not None:
+            return cached
+        pending = self._inflight.get(waybill)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        async def fetch_one():
+            payloads = await self._fetch([waybill])
+            return payloads.get(waybill, {})
+
+        pending = asyncio.ensure_future(fetch_one())
+        self._inflight[waybill] = pending
+        pending.add_done_callback(lambda _: self._inflight.pop(waybill, None))
+        return await asyncio.shield(pending)
+
+    async def refresh_active(self) -> int:
+        """
+        Refresh every in-transit waybill in bulk; returns how many were polled
+        """
+        if self.db is None:
+            return 0
+        orders = await self.db.orders.find(
+            {"delhivery_waybill": {"$nin": [None, ""]}, "status": {"$in": self.ACTIVE_ORDER_STATUSES}},
+            {"_id": 0, "delhivery_waybill": 1}
+        ).to_list(10000)
+        waybills = list(dict.fromkeys(str(o["delhivery_waybill"]) for o in orders))
+        for i in range(0, len(waybills), self.batch_size):
+            batch = waybills[i:i + self.batch_size]
+            try:
+                await self._fetch(batch)
+            except Exception as e:
+                print(f"Tracking poll failed for {len(batch)} waybills: {e}")
+        self.last_poll_at = datetime.now(timezone.utc).isoformat()
+        self.last_poll_count = len(waybills)
+        return len(waybills)
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.refresh_active()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Tracking poller error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self, db):
+        self.db = db
+        if self._poller is None and self.poll_interval > 0:
+            self._poller = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "poll_interval": self.poll_interval,
+            "last_poll_at": self.last_poll_at,
+            "last_poll_count": self.last_poll_count,
+        }
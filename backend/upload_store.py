@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _write_chunk(f, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+def _hash_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class UploadStore:
+    """
+    Content-addressed storage for uploaded files.
+
+    Request bodies are streamed to a temp file in chunks on a thread pool while
+    their SHA-256 is computed, then stored as <digest><ext>. A file whose content
+    is already stored, including uploads saved under the older UUID naming, is
+    not written again; its existing path is returned instead.
+    """
+
+    def __init__(self, uploads_dir: Path, max_workers: int = 4, chunk_size: int = CHUNK_SIZE):
+        self.uploads_dir = Path(uploads_dir)
+        self.incoming_dir = self.uploads_dir / ".incoming"
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uploads")
+        self._index: Optional[Dict[str, str]] = None
+        self._index_lock = asyncio.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_written = 0
+
+    def _build_index(self) -> Dict[str, str]:
+        index: Dict[str, str] = {}
+        for entry in sorted(os.scandir(self.uploads_dir), key=lambda e: e.name):
+            if entry.is_file() and not entry.name.startswith("."):
+                try:
+                    index.setdefault(_hash_file(Path(entry.path)), entry.name)
+                except OSError:
+                    continue
+        return index
+
+    async def _get_index(self) -> Dict[str, str]:
+        """
+        Digest -> filename for everything already in uploads/, hashed once per process
+        """
+        if self._index is None:
+            async with self._index_lock:
+                if self._index is None:
+                    loop = asyncio.get_running_loop()
+                    self._index = await loop.run_in_executor(self._executor, self._build_index)
+        return self._index
+
+    async def save(self, file: UploadFile) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        index = await self._get_index()
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.incoming_dir))
+        tmp_path = Path(tmp_name)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    await loop.run_in_executor(self._executor, _write_chunk, f, hasher, chunk)
+            digest = hasher.hexdigest()
+
+            existing = index.get(digest)
+            if existing and (self.uploads_dir / existing).exists():
+                tmp_path.unlink()
+                self.deduplicated += 1
+                return {"filename": existing, "path": f"/uploads/{existing}", "sha256": digest, "size": size, "deduplicated": True}
+
+            suffix = Path(file.filename or "").suffix.lower()
+            filename = f"{digest[:32]}{suffix}"
+            os.replace(tmp_path, self.uploads_dir / filename)
+        except Exception:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+        index[digest] = filename
+        self.stored += 1
+        self.bytes_written += size
+        return {"filename": filename, "path": f"/uploads/{filename}", "sha256": digest, "size": size, "deduplicated": False}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexed_files": len(self._index) if self._index is not None else None,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "bytes_written": self.bytes_written,
+        }
@@ -1,4 +1,11 @@
-import { apiClient } from './api';
+import { API, apiClient } from './api';
+
+// Events are queued and sent together to cut one request per page view/click
+const BATCH_SIZE = 20;
+const FLUSH_DELAY_MS = 5000;
+const MAX_QUEUE = 200;
+let queue = [];
+let flushTimer = null;
 
 // Generate a unique session ID if not exists
 const getSessionId = () => {
@@ -10,11 +17,83 @@ const getSessionId = () => {
   return sessionId;
 };
 
+// The batch endpoint accepts at most this many events per request
+const MAX_BATCH = 100;
+
+const sendKeepalive = (events) => {
+  const token = localStorage.getItem('token');
+  return fetch(`${API}/analytics/events/batch`, {
+    method: 'POST',
+    keepalive: true,
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {})
+    },
+    body: JSON.stringify({ events })
+  });
+};
+
+// Send queued events; on unload, send the whole queue as keepalive requests so it survives navigation
+const flushEvents = async (keepalive = false) => {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (queue.length === 0) return;
+  if (keepalive) {
+    // The page may be going away: start every request now rather than awaiting each one
+    const events = queue;
+    queue = [];
+    for (let i = 0; i < events.length; i += MAX_BATCH) {
+      sendKeepalive(events.slice(i, i + MAX_BATCH)).catch(() => {});
+    }
+    return;
+  }
+  const events = queue.slice(0, MAX_BATCH);
+  queue = queue.slice(MAX_BATCH);
+  try {
+    await apiClient.post('/analytics/events/batch', { events });
+  } catch (error) {
+    // Server is shedding load: keep the events for the next flush, within limits
+    if (error?.response?.status === 503) {
+      queue = [...events, ...queue].slice(0, MAX_QUEUE);
+    }
+  }
+  if (queue.length > 0) {
+    scheduleFlush();
+  }
+};
+
+const scheduleFlush = () => {
+  if (!flushTimer) {
+    flushTimer = setTimeout(() => flushEvents(), FLUSH_DELAY_MS);
+  }
+};
+
+const enqueueEvent = (event) => {
+  if (queue.length >= MAX_QUEUE) return;
+  queue.push(event);
+  if (queue.length >= BATCH_SIZE) {
+    flushEvents();
+  } else {
+    scheduleFlush();
+  }
+};
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', () => flushEvents(true));
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+      flushEvents(true);
+    }
+  });
+}
+
 // Track a page view
 export const trackPageView = async (path) => {
   try {
     const sessionId = getSessionId();
-    await apiClient.post('/analytics/events', {
+    enqueueEvent({
       event_type: 'page_view',
       page: path,
       session_id: sessionId,
@@ -45,7 +124,7 @@ export const trackEvent = async (eventName, data = {}, productId = null) => {
       payload.product_id = productId;
     }
 
-    await apiClient.post('/analytics/events', payload);
+    enqueueEvent(payload);
   } catch (error) {
   }
 };
@@ -110,8 +110,8 @@ For privacy-related questions or to exercise your rights:
 ## Governing Law
 
 This privacy policy is governed by the laws of India.""",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -240,8 +240,8 @@ Phone: +91-XXXXXXXXXX
 ---
 
 *We strive to make returns as hassle-free as possible. Your satisfaction is our priority!*""",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -410,14 +410,14 @@ Address: [Business Address]
 **Version:** 1.0
 
 By using our website, you acknowledge that you have read, understood, and agree to be bound by these Terms and Conditions.""",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
     }
 ]
 
 async def seed_cms_pages():
     print("Connecting to MongoDB...")
-    client = AsyncIOMotorClient(mongo_url)
+    client = AsyncIOMotorClient(mongo_url, tz_aware=True)
     db = client[db_name]
     
     try:
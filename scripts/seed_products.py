@@ -40,7 +40,7 @@ sample_products = [
         "rating": 4.5,
         "reviews_count": 24,
         "is_featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -63,7 +63,7 @@ sample_products = [
         "rating": 4.2,
         "reviews_count": 156,
         "is_featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -85,7 +85,7 @@ sample_products = [
         "rating": 4.3,
         "reviews_count": 89,
         "is_featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -107,7 +107,7 @@ sample_products = [
         "rating": 4.6,
         "reviews_count": 67,
         "is_featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -129,7 +129,7 @@ sample_products = [
         "rating": 4.7,
         "reviews_count": 43,
         "is_featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -151,7 +151,7 @@ sample_products = [
         "rating": 4.4,
         "reviews_count": 92,
         "is_featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -173,7 +173,7 @@ sample_products = [
         "rating": 4.5,
         "reviews_count": 78,
         "is_featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -195,7 +195,7 @@ sample_products = [
         "rating": 4.3,
         "reviews_count": 134,
         "is_featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -217,7 +217,7 @@ sample_products = [
         "rating": 4.6,
         "reviews_count": 56,
         "is_featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -239,13 +239,13 @@ sample_products = [
         "rating": 4.1,
         "reviews_count": 72,
         "is_featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
 ]
 
 async def seed_database():
     print("Connecting to MongoDB...")
-    client = AsyncIOMotorClient(mongo_url)
+    client = AsyncIOMotorClient(mongo_url, tz_aware=True)
     db = client[db_name]
     
     try: